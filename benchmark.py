@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Sincronizador: SQL Server a MariaDB
+Autor: DBCoop
+Descripción: Genera tablas sintéticas con la forma de SOCIOS / SUMSOC_HST y ejecuta la sincronización
+completa (sync_table) contra bases locales de reemplazo (SQLite) o servidores reales de prueba,
+midiendo registros/segundo, memoria pico y tiempos por fase para comparar resultados entre commits.
+
+Uso:
+    python benchmark.py run --rows 100000 --tables SOCIOS,SUMSOC_HST
+    python benchmark.py run --source sqlserver --target mariadb --set SYNC_WRITER=load_data
+    python benchmark.py compare logs/benchmarks/antes.json logs/benchmarks/despues.json
+"""
+
+import os
+import sys
+import json
+import re
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Columnas fijas de cada forma de tabla: (nombre, tipo, longitud, precisión, escala)
+TABLE_SHAPES = {
+    'SOCIOS': {
+        'width': 60,
+        'columns': [
+            ('NRO_SOCIO', 'int', None, 10, 0),
+            ('APELLIDO', 'nvarchar', 60, None, None),
+            ('NOMBRE', 'nvarchar', 60, None, None),
+            ('DOCUMENTO', 'varchar', 15, None, None),
+            ('FECHA_ALTA', 'datetime2', None, None, None),
+            ('ACTIVO', 'bit', None, None, None),
+            ('CUOTA', 'money', None, 19, 4),
+            ('DOMICILIO', 'nvarchar', 120, None, None),
+            ('EMAIL', 'nvarchar', 100, None, None),
+            ('SALDO', 'decimal', None, 18, 2)
+        ],
+        'indexes': [('IX_SOCIOS_APELLIDO', ['APELLIDO', 'NOMBRE'])]
+    },
+    'SUMSOC_HST': {
+        'width': 9,
+        'columns': [
+            ('ID', 'bigint', None, 19, 0),
+            ('NRO_SOCIO', 'int', None, 10, 0),
+            ('SUMINISTRO', 'int', None, 10, 0),
+            ('PERIODO', 'varchar', 6, None, None),
+            ('FECHA', 'datetime2', None, None, None),
+            ('CONSUMO', 'decimal', None, 12, 3),
+            ('IMPORTE', 'money', None, 19, 4),
+            ('PAGADO', 'bit', None, None, None),
+            ('OBS', 'nvarchar', 200, None, None)
+        ],
+        'indexes': [('IX_SUMSOC_HST_SOCIO', ['NRO_SOCIO', 'PERIODO'])]
+    }
+}
+
+# Tipos de las columnas de relleno hasta completar el ancho pedido
+FILLER_TYPES = {
+    'int': ('int', None, 10, 0),
+    'bigint': ('bigint', None, 19, 0),
+    'nvarchar': ('nvarchar', 50, None, None),
+    'varchar': ('varchar', 30, None, None),
+    'datetime2': ('datetime2', None, None, None),
+    'datetime': ('datetime', None, None, None),
+    'bit': ('bit', None, None, None),
+    'money': ('money', None, 19, 4),
+    'decimal': ('decimal', None, 18, 2)
+}
+
+TEXT_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ñáéíóúÑ'
+BASE_DATE = datetime(2015, 1, 1)
+GENERATE_BATCH = 10000
+
+# SQLite como reemplazo de SQL Server: los tipos declarados se convierten a los tipos que devolvería el driver
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('BIT', lambda value: value == b'1')
+sqlite3.register_converter('MONEY', lambda value: Decimal(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+sqlite3.register_converter('DATETIME2', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+def build_table_spec(shape, width=None, filler_types=None, prefix='BENCH_'):
+    """Definir una tabla sintética: columnas con el formato de la metadata del sincronizador"""
+    base = TABLE_SHAPES[shape]
+    width = max(width or base['width'], len(base['columns']))
+    filler_types = filler_types or ['int', 'nvarchar', 'datetime2', 'bit', 'money']
+
+    definitions = list(base['columns'])
+    for i in range(width - len(definitions)):
+        data_type, length, precision, scale = FILLER_TYPES[filler_types[i % len(filler_types)]]
+        definitions.append((f'COL_{data_type.upper()}_{i + 1}', data_type, length, precision, scale))
+
+    columns = []
+    for index, (name, data_type, length, precision, scale) in enumerate(definitions):
+        nullable = 'NO' if index == 0 else 'YES'
+        columns.append((name, data_type, length, precision, scale, nullable, None))
+
+    indexes = [{'name': f'{prefix}{name}', 'unique': False, 'columns': index_columns}
+               for name, index_columns in base['indexes']]
+    return {'shape': shape, 'name': f'{prefix}{shape}', 'columns': columns, 'keys': [columns[0][0]], 'indexes': indexes}
+
+def column_declaration(col):
+    """Tipo de SQL Server de una columna sintética"""
+    name, data_type, length, precision, scale = col[:5]
+    if data_type in ['nvarchar', 'varchar']:
+        return f'{data_type}({length})'
+    if data_type == 'decimal':
+        return f'decimal({precision},{scale})'
+    return data_type
+
+def generate_rows(spec, rows, seed):
+    """Generar filas deterministas por lotes (la memoria no crece con el número de filas)"""
+    rng = random.Random(seed)
+
+    def value(col):
+        data_type, length = col[1], col[2]
+        if col[5] == 'YES' and rng.random() < 0.05:
+            return None
+        if data_type in ['int', 'bigint']:
+            return rng.randint(1, 2000000)
+        if data_type in ['nvarchar', 'varchar']:
+            size = rng.randint(1, length)
+            chars = TEXT_CHARS if data_type == 'nvarchar' else TEXT_CHARS[:63]
+            return ''.join(rng.choice(chars) for _ in range(size))
+        if data_type in ['datetime2', 'datetime']:
+            return BASE_DATE + timedelta(seconds=rng.randint(0, 300000000), microseconds=rng.randint(0, 999999))
+        if data_type == 'bit':
+            return rng.random() < 0.5
+        if data_type == 'money':
+            return Decimal(rng.randint(0, 100000000)).scaleb(-4)
+        if data_type == 'decimal':
+            return Decimal(rng.randint(-10 ** 8, 10 ** 8)).scaleb(-col[4])
+        return None
+
+    batch = []
+    for row_number in range(1, rows + 1):
+        # La primera columna es la clave primaria: secuencial y sin NULL
+        batch.append(tuple([row_number] + [value(col) for col in spec['columns'][1:]]))
+        if len(batch) == GENERATE_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class SqliteSource:
+    """Origen de reemplazo: archivo SQLite consultado con la misma sintaxis [columna] que SQL Server"""
+
+    name = 'sqlite'
+
+    def __init__(self, sync, workdir):
+        self.path = os.path.join(workdir, 'source.db')
+
+    def connect(self):
+        # La etapa de lectura del pipeline usa el cursor desde otro hilo
+        return sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+
+    def create(self, spec, rows, seed):
+        conn = self.connect()
+        columns_sql = ', '.join([f'[{col[0]}] {column_declaration(col)}' for col in spec['columns']])
+        conn.execute(f"DROP TABLE IF EXISTS [{spec['name']}]")
+        conn.execute(f"CREATE TABLE [{spec['name']}] ({columns_sql}, PRIMARY KEY ([{spec['keys'][0]}]))")
+        for index in spec['indexes']:
+            conn.execute(f"CREATE INDEX [{index['name']}] ON [{spec['name']}] ({', '.join(index['columns'])})")
+        placeholders = ', '.join(['?'] * len(spec['columns']))
+        for batch in generate_rows(spec, rows, seed):
+            conn.executemany(f"INSERT INTO [{spec['name']}] VALUES ({placeholders})", batch)
+            conn.commit()
+        conn.close()
+
+    def drop(self, spec):
+        conn = self.connect()
+        conn.execute(f"DROP TABLE IF EXISTS [{spec['name']}]")
+        conn.commit()
+        conn.close()
+
+class SqlServerSource:
+    """Origen real: la base SQL Server de config.env (usar una base de pruebas)"""
+
+    name = 'sqlserver'
+
+    def __init__(self, sync, workdir):
+        self.sync = sync
+
+    def connect(self):
+        return self.sync.open_sqlserver_connection()
+
+    def create(self, spec, rows, seed):
+        conn = self.connect()
+        cursor = conn.cursor()
+        columns_sql = ', '.join([f'[{col[0]}] {column_declaration(col)}' for col in spec['columns']])
+        cursor.execute(f"IF OBJECT_ID('{spec['name']}', 'U') IS NOT NULL DROP TABLE [{spec['name']}]")
+        cursor.execute(f"CREATE TABLE [{spec['name']}] ({columns_sql}, PRIMARY KEY ([{spec['keys'][0]}]))")
+        for index in spec['indexes']:
+            cursor.execute(f"CREATE INDEX [{index['name']}] ON [{spec['name']}] ({', '.join(index['columns'])})")
+        conn.commit()
+
+        # pyodbc usa ? y puede enviar los lotes en bloque; pymssql usa %s
+        is_pymssql = type(conn).__module__.startswith('pymssql')
+        marker = '%s' if is_pymssql else '?'
+        if not is_pymssql:
+            cursor.fast_executemany = True
+        placeholders = ', '.join([marker] * len(spec['columns']))
+        for batch in generate_rows(spec, rows, seed):
+            cursor.executemany(f"INSERT INTO [{spec['name']}] VALUES ({placeholders})", batch)
+            conn.commit()
+        cursor.close()
+        conn.close()
+
+    def drop(self, spec):
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(f"IF OBJECT_ID('{spec['name']}', 'U') IS NOT NULL DROP TABLE [{spec['name']}]")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+class SqliteTargetCursor:
+    """Cursor que traduce a SQLite las sentencias que el sincronizador envía a MariaDB"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def translate(self, query):
+        """Devolver las sentencias SQLite equivalentes (ninguna para los SET de sesión)"""
+        query = query.replace('%s', '?')
+        if query.startswith('SET SESSION'):
+            return []
+        if query.startswith('CREATE TABLE'):
+            # SQLite compara los textos en binario por defecto
+            return [query.replace(' CHARACTER SET utf8mb4 COLLATE utf8mb4_bin', '')]
+        if query.startswith('TRUNCATE TABLE'):
+            return ['DELETE FROM' + query[len('TRUNCATE TABLE'):]]
+        if ' ON DUPLICATE KEY UPDATE ' in query:
+            return ['INSERT OR REPLACE' + query[len('INSERT'):query.index(' ON DUPLICATE KEY UPDATE ')]]
+        if query.startswith('RENAME TABLE'):
+            renames = re.findall(r"`([^`]+)` TO `([^`]+)`", query)
+            return [f"ALTER TABLE `{old}` RENAME TO `{new}`" for old, new in renames]
+        add_index = re.match(r"ALTER TABLE `(.+)` ADD (UNIQUE )?INDEX `(.+)` \((.+)\)$", query)
+        if add_index:
+            table_name, unique, index_name, columns = add_index.groups()
+            return [f"CREATE {unique or ''}INDEX `{index_name}` ON `{table_name}` ({columns.replace('(255)', '')})"]
+        if ' DROP INDEX IF EXISTS ' in query:
+            return [f"DROP INDEX IF EXISTS `{name}`" for name in re.findall(r"DROP INDEX IF EXISTS `([^`]+)`", query)]
+        return [query]
+
+    def execute(self, query, params=()):
+        for statement in self.translate(query):
+            self.cursor.execute(statement, params)
+        return self.cursor
+
+    def executemany(self, query, rows):
+        return self.cursor.executemany(self.translate(query)[0], rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+class SqliteTargetConnection:
+    """Conexión SQLite con la interfaz que el sincronizador usa de mysql.connector"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return SqliteTargetCursor(self.conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+class SqliteTarget:
+    """Destino de reemplazo: archivo SQLite (sin LOAD DATA ni upsert de MariaDB)"""
+
+    name = 'sqlite'
+    supports_load_data = False
+
+    def __init__(self, sync, workdir):
+        self.path = os.path.join(workdir, 'target.db')
+
+    def connect(self):
+        return SqliteTargetConnection(self.path)
+
+    def describe(self, table_name):
+        conn = self.connect()
+        rows = conn.execute(f"PRAGMA table_info(`{table_name}`)").fetchall()
+        conn.close()
+        return [(row[1], row[2]) for row in rows] or None
+
+    def drop(self, spec):
+        conn = self.connect()
+        conn.execute(f"DROP TABLE IF EXISTS `{spec['name']}`")
+        conn.commit()
+        conn.close()
+
+class MariaDBTarget:
+    """Destino real: la base MariaDB de config.env (usar una base de pruebas)"""
+
+    name = 'mariadb'
+    supports_load_data = True
+
+    def __init__(self, sync, workdir):
+        self.sync = sync
+
+    def connect(self):
+        return self.sync.open_mariadb_connection()
+
+    def describe(self, table_name):
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (self.sync.mariadb_config['database'], table_name)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return rows or None
+
+    def drop(self, spec):
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS `{spec['name']}`")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+SOURCES = {'sqlite': SqliteSource, 'sqlserver': SqlServerSource}
+TARGETS = {'sqlite': SqliteTarget, 'mariadb': MariaDBTarget}
+
+def peak_rss_mb():
+    """Memoria residente máxima del proceso en MB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+def git_revision():
+    """Commit actual del repositorio (y si hay cambios sin confirmar)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here, text=True).strip())
+        return commit, dirty
+    except Exception:
+        return 'unknown', False
+
+def run_benchmark(args):
+    """Generar las tablas, sincronizarlas y guardar el resultado en JSON"""
+    workdir = tempfile.mkdtemp(prefix='dbsync_bench_')
+
+    # Estado y reportes aislados de los de producción; --set permite comparar configuraciones
+    os.environ['SYNC_STATE_FILE'] = os.path.join(workdir, 'sync_state.db')
+    os.environ['SYNC_REPORT_DIR'] = os.path.join(workdir, 'reports')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    for setting in args.set:
+        key, _, value = setting.partition('=')
+        os.environ[key.strip()] = value.strip()
+
+    from db_sync import DatabaseSyncronizer, ConnectionPool
+
+    sync = DatabaseSyncronizer()
+    source = SOURCES[args.source](sync, workdir)
+    target = TARGETS[args.target](sync, workdir)
+    pool_size = max(2, sync.workers * 2)
+    sync.sqlserver_pool = ConnectionPool('SQL Server', sync.timed_connect(source.connect), pool_size)
+    sync.mariadb_pool = ConnectionPool('MariaDB', sync.timed_connect(target.connect), pool_size)
+    if not target.supports_load_data:
+        sync.load_data_rejected = True
+
+    filler_types = [t.strip().lower() for t in args.types.split(',') if t.strip()]
+    commit, dirty = git_revision()
+    results = []
+
+    for shape in [s.strip().upper() for s in args.tables.split(',') if s.strip()]:
+        spec = build_table_spec(shape, args.width, filler_types)
+        print(f"Generando {args.rows} registros en {spec['name']} ({len(spec['columns'])} columnas, origen {source.name})...")
+        source.create(spec, args.rows, args.seed)
+
+        for repeat in range(1, args.repeat + 1):
+            target.drop(spec)
+            sync.reset_run_metrics()
+            sync.reset_schema_metadata()
+
+            start = time.perf_counter()
+            metrics = sync.get_table_metrics(spec['name'])
+            with metrics.measure('metadata'):
+                sync.schema['loaded'].add(spec['name'].upper())
+                sync.schema['sqlserver'][spec['name']] = spec['columns']
+                sync.schema['keys'][spec['name']] = spec['keys']
+                sync.schema['indexes'][spec['name']] = spec['indexes']
+                sync.schema['mariadb'][spec['name']] = target.describe(spec['name'])
+
+            sync.sync_table(spec['name'])
+            elapsed = time.perf_counter() - start
+            sync.close_connections()
+
+            table_report = metrics.to_dict()
+            result = {
+                'table': spec['name'],
+                'shape': shape,
+                'repeat': repeat,
+                'rows': table_report['rows'],
+                'columns': len(spec['columns']),
+                'seconds': round(elapsed, 3),
+                'rows_per_sec': round(table_report['rows'] / elapsed, 1) if elapsed else None,
+                'peak_rss_mb': peak_rss_mb(),
+                'phases': table_report['phases']
+            }
+            results.append(result)
+            print(f"  {spec['name']} #{repeat}: {result['rows']} registros en {result['seconds']}s "
+                  f"({result['rows_per_sec']} reg/s, RSS pico {result['peak_rss_mb']} MB)")
+
+        if not args.keep:
+            source.drop(spec)
+            target.drop(spec)
+
+    summary = {}
+    for shape_results in group_by_table(results).values():
+        table_name = shape_results[0]['table']
+        summary[table_name] = {
+            'rows_per_sec': statistics.median([r['rows_per_sec'] for r in shape_results]),
+            'seconds': statistics.median([r['seconds'] for r in shape_results]),
+            'peak_rss_mb': max([r['peak_rss_mb'] for r in shape_results])
+        }
+
+    output = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'source': source.name,
+        'target': target.name,
+        'rows': args.rows,
+        'seed': args.seed,
+        'settings': {key: value for key, value in sorted(os.environ.items()) if key.startswith('SYNC_')
+                     and key not in ['SYNC_STATE_FILE', 'SYNC_REPORT_DIR']},
+        'summary': summary,
+        'results': results
+    }
+
+    path = args.output or os.path.join('logs', 'benchmarks',
+                                       f"bench_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, ensure_ascii=False, default=str)
+    print(f"Resultado guardado en {path}")
+    return output
+
+def group_by_table(results):
+    groups = {}
+    for result in results:
+        groups.setdefault(result['table'], []).append(result)
+    return groups
+
+def compare_results(paths):
+    """Comparar registros/segundo y tiempos por fase de dos o más resultados"""
+    runs = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            runs.append(json.load(f))
+
+    baseline = runs[0]
+    for table_name in baseline['summary']:
+        print(f"\n{table_name}")
+        print(f"  {'commit':<14}{'reg/s':>12}{'x':>8}{'RSS MB':>10}  fases (s, mediana)")
+        for run in runs:
+            if table_name not in run['summary']:
+                continue
+            summary = run['summary'][table_name]
+            ratio = summary['rows_per_sec'] / baseline['summary'][table_name]['rows_per_sec']
+            phases = {}
+            for result in group_by_table(run['results'])[table_name]:
+                for phase, totals in result['phases'].items():
+                    phases.setdefault(phase, []).append(totals['seconds'])
+            phases_str = ', '.join([f"{phase} {statistics.median(values):.2f}" for phase, values in phases.items()])
+            label = run['commit'] + ('*' if run['dirty'] else '')
+            print(f"  {label:<14}{summary['rows_per_sec']:>12.0f}{ratio:>8.2f}{summary['peak_rss_mb']:>10.1f}  {phases_str}")
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Benchmark del sincronizador SQL Server -> MariaDB')
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='Generar tablas sintéticas y medir la sincronización')
+    run.add_argument('--tables', default='SOCIOS,SUMSOC_HST', help='Formas de tabla: SOCIOS, SUMSOC_HST')
+    run.add_argument('--rows', type=int, default=50000, help='Registros por tabla')
+    run.add_argument('--width', type=int, default=None, help='Columnas por tabla (por defecto el de cada forma)')
+    run.add_argument('--types', default='int,nvarchar,datetime2,bit,money',
+                     help=f"Tipos de las columnas de relleno: {','.join(FILLER_TYPES)}")
+    run.add_argument('--source', choices=SOURCES, default='sqlite')
+    run.add_argument('--target', choices=TARGETS, default='sqlite')
+    run.add_argument('--repeat', type=int, default=3, help='Repeticiones por tabla')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--set', action='append', default=[], metavar='CLAVE=VALOR',
+                     help='Variable de entorno para la ejecución (ej. SYNC_CHUNK_SIZE=10000)')
+    run.add_argument('--output', help='Archivo JSON de resultado (por defecto logs/benchmarks/)')
+    run.add_argument('--keep', action='store_true', help='No eliminar las tablas generadas')
+
+    compare = commands.add_parser('compare', help='Comparar resultados de distintos commits')
+    compare.add_argument('files', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_benchmark(args)
+    elif args.command == 'compare':
+        compare_results(args.files)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
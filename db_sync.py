@@ -8,17 +8,500 @@ Descripción: Script para sincronizar datos entre SQL Server y MariaDB automáti
 import os
 import sys
 import logging
-import pandas as pd
 import pyodbc
 import pymssql
 import mysql.connector
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-import schedule
 import time
 import traceback
 import re
+from decimal import Decimal, ROUND_HALF_UP
+import sqlite3
+import hashlib
+import shutil
+import json
+import tempfile
+import threading
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Errores de MariaDB cuando el servidor o el cliente no permiten LOAD DATA LOCAL INFILE
+LOCAL_INFILE_ERRNOS = (1148, 2068, 3948, 3950)
+
+# Errores de MariaDB por un paquete o valor mayor que max_allowed_packet (servidor y cliente)
+PACKET_TOO_LARGE_ERRNOS = (1153, 1301, 2020)
+
+# Errores de MariaDB por conexión perdida
+CONNECTION_LOST_ERRNOS = (2006, 2013, 2055)
+
+# Límites del tamaño de lote de inserción en bytes
+MIN_BATCH_BYTES = 64 * 1024
+DEFAULT_MAX_ALLOWED_PACKET = 16 * 1024 * 1024
+
+# Largo máximo en bytes de una clave o índice en InnoDB (formato de fila DYNAMIC)
+MAX_KEY_BYTES = 3072
+
+# Caracteres que LOAD DATA requiere escapar (con ESCAPED BY '\\')
+TSV_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'}
+TSV_ESCAPE_RE = re.compile('[\\\\\t\n\r\0]')
+TSV_BYTES_ESCAPES = {key.encode(): value.encode() for key, value in TSV_ESCAPES.items()}
+TSV_BYTES_ESCAPE_RE = re.compile(b'[\\\\\t\n\r\0]')
+
+# Nombre con el que se guarda la versión de Change Tracking en la tabla de marcas de agua
+CHANGE_TRACKING_WATERMARK = 'CHANGE_TRACKING_VERSION'
+
+# Marca de fin de datos entre etapas del pipeline de copia
+PIPELINE_END = object()
+
+class PipelineError:
+    """Error ocurrido en una etapa del pipeline, entregado a la etapa siguiente"""
+    
+    def __init__(self, error):
+        self.error = error
+
+def to_optional_str(value):
+    """Convertir a str conservando NULL"""
+    return None if value is None else str(value)
+
+class PooledConnection:
+    """Conexión prestada por un ConnectionPool: close() la devuelve al pool en lugar de cerrarla"""
+    
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+    
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+    
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+class ConnectionPool:
+    """Pool de conexiones reutilizables, seguro entre hilos y sin límite de préstamos"""
+    
+    def __init__(self, name, factory, max_idle, validate=None):
+        self.name = name
+        self.factory = factory
+        self.max_idle = max_idle
+        self.validate = validate
+        self.idle = []
+        self.opened = 0
+        self.lock = threading.Lock()
+    
+    def get(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                connection = self.idle.pop()
+            # Una conexión inactiva pudo ser cerrada por el servidor (wait_timeout, reinicio, red)
+            if self.validate is None or self.is_alive(connection):
+                return PooledConnection(self, connection)
+            self.discard(connection)
+        
+        connection = self.factory()
+        with self.lock:
+            self.opened += 1
+        return PooledConnection(self, connection)
+    
+    def release(self, connection):
+        try:
+            # Descartar cualquier transacción pendiente antes de reutilizar la conexión
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+        
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        self.discard(connection)
+    
+    def is_alive(self, connection):
+        try:
+            self.validate(connection)
+            return True
+        except Exception:
+            return False
+    
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            self.discard(connection)
+
+class TableMetrics:
+    """Tiempo, filas y bytes por fase de la sincronización de una tabla"""
+    
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.status = 'running'
+        self.error = None
+        self.rows = 0
+        self.started = time.time()
+        self.finished = None
+        self.phases = {}
+        self.lock = threading.Lock()
+    
+    def add(self, phase, seconds, rows=0, size=0):
+        with self.lock:
+            totals = self.phases.setdefault(phase, {'seconds': 0.0, 'rows': 0, 'bytes': 0, 'calls': 0})
+            totals['seconds'] += seconds
+            totals['rows'] += rows
+            totals['bytes'] += size
+            totals['calls'] += 1
+    
+    @contextmanager
+    def measure(self, phase, rows=0, size=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started, rows, size)
+    
+    def finish(self, status, rows=0, error=None):
+        self.status = status
+        self.rows = rows
+        self.error = error
+        self.finished = time.time()
+    
+    def to_dict(self):
+        with self.lock:
+            phases = {}
+            for phase, totals in self.phases.items():
+                phases[phase] = dict(totals)
+                phases[phase]['seconds'] = round(totals['seconds'], 3)
+                phases[phase]['rows_per_sec'] = round(totals['rows'] / totals['seconds'], 1) if totals['seconds'] and totals['rows'] else None
+        duration = (self.finished or time.time()) - self.started
+        return {
+            'table': self.table_name,
+            'status': self.status,
+            'error': self.error,
+            'rows': self.rows,
+            'seconds': round(duration, 3),
+            'rows_per_sec': round(self.rows / duration, 1) if duration and self.rows else None,
+            'phases': phases
+        }
+
+class BatchWriter:
+    """Escritor de bloques en MariaDB: lotes por bytes estimados, ajustados por latencia y con commit configurable"""
+    
+    def __init__(self, syncronizer, table_name, target, metrics, on_commit=None):
+        self.sync = syncronizer
+        self.target = target
+        self.metrics = metrics
+        self.mode = syncronizer.get_table_setting(table_name, 'WRITER', 'executemany').lower()
+        self.batch_bytes = int(syncronizer.get_table_setting(table_name, 'BATCH_BYTES', 4 * 1024 * 1024))
+        self.target_seconds = float(syncronizer.get_table_setting(table_name, 'BATCH_TARGET_MS', 500)) / 1000
+        
+        # Commit por lote (batch), cada N lotes o una sola vez al final de la copia (table)
+        commit = syncronizer.get_table_setting(table_name, 'COMMIT', 'batch').lower()
+        self.commit_every = 0 if commit == 'table' else 1 if commit == 'batch' else max(1, int(commit))
+        
+        self.insert_query = syncronizer.build_insert_query(target)
+        self.lob_indexes = (target.get('lob') or {}).get('indexes')
+        self.on_commit = on_commit
+        self.pending = 0
+        self.pending_rows = 0
+        self.last_row = None
+        self.conn = None
+        self.cursor = None
+        self.open()
+    
+    def open(self):
+        """Tomar una conexión del pool y acotar los lotes a max_allowed_packet"""
+        self.conn = self.sync.connect_mariadb()
+        self.cursor = self.conn.cursor()
+        
+        # En una carga masiva sobre una tabla vacía no hace falta verificar unicidad ni claves foráneas fila a fila
+        if self.target.get('bulk'):
+            self.cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        
+        if self.sync.max_allowed_packet is None:
+            try:
+                self.cursor.execute("SELECT @@max_allowed_packet")
+                self.sync.max_allowed_packet = int(self.cursor.fetchone()[0])
+            except Exception:
+                self.sync.max_allowed_packet = DEFAULT_MAX_ALLOWED_PACKET
+        
+        # Margen para el texto del INSERT y el escapado de los valores
+        self.max_bytes = max(MIN_BATCH_BYTES, self.sync.max_allowed_packet * 3 // 4)
+        self.batch_bytes = max(MIN_BATCH_BYTES, min(self.batch_bytes, self.max_bytes))
+    
+    def write(self, data):
+        """Escribir un bloque del pipeline"""
+        if self.mode == 'load_data' and not self.sync.load_data_rejected:
+            try:
+                with self.metrics.measure('write', len(data), self.sync.estimate_rows_bytes(data, self.lob_indexes)):
+                    self.sync.load_data_chunk(self.cursor, self.target, data)
+                self.batch_written(data)
+                return
+            except mysql.connector.Error as e:
+                if e.errno not in LOCAL_INFILE_ERRNOS:
+                    raise
+                # La sentencia rechazada no altera la transacción: los lotes pendientes se conservan
+                self.sync.load_data_rejected = True
+                self.sync.logger.warning(f"MariaDB rechazó LOAD DATA LOCAL INFILE ({str(e)}) - se usa executemany")
+        
+        if self.lob_indexes:
+            # Con objetos grandes el tamaño de cada fila varía mucho: los lotes se cortan por los bytes de cada fila
+            position = 0
+            while position < len(data):
+                end, size = position, 0
+                while end < len(data):
+                    size += self.sync.estimate_rows_bytes([data[end]], self.lob_indexes)
+                    if end > position and size > self.batch_bytes:
+                        break
+                    end += 1
+                self.insert(data[position:end])
+                position = end
+            return
+        
+        # Insertar en lotes de aproximadamente batch_bytes (recalculado después de cada lote)
+        row_bytes = max(1, self.sync.estimate_rows_bytes(data) // len(data))
+        position = 0
+        while position < len(data):
+            batch = data[position:position + max(1, self.batch_bytes // row_bytes)]
+            self.insert(batch)
+            position += len(batch)
+    
+    def insert(self, batch, retried=False):
+        """Insertar un lote; si MariaDB lo rechaza por tamaño se divide a la mitad y se reintenta,
+        y si se pierde la conexión se reconecta y se reintenta el lote completo una vez"""
+        size = self.sync.estimate_rows_bytes(batch, self.lob_indexes)
+        started = time.perf_counter()
+        try:
+            self.cursor.executemany(self.insert_query, batch)
+        except mysql.connector.Error as e:
+            if e.errno in CONNECTION_LOST_ERRNOS and not retried:
+                self.recover(e)
+                self.sync.logger.warning(f"Conexión perdida insertando {len(batch)} registros en '{self.target['table']}' "
+                                         f"({str(e)}) - se reconecta y se reintenta el lote")
+                self.insert(batch, retried=True)
+                return
+            if e.errno not in PACKET_TOO_LARGE_ERRNOS:
+                raise
+            if len(batch) == 1:
+                raise Exception(f"Un registro de '{self.target['table']}' (~{size} bytes) supera max_allowed_packet "
+                                f"({self.sync.max_allowed_packet} bytes): {str(e)}")
+            self.recover(e)
+            # El tamaño rechazado pasa a ser el techo: el ajuste por latencia no vuelve a superarlo
+            self.max_bytes = max(MIN_BATCH_BYTES, min(self.max_bytes, size // 2))
+            self.batch_bytes = min(self.batch_bytes, self.max_bytes)
+            self.sync.logger.warning(f"Lote de {len(batch)} registros (~{size} bytes) rechazado por MariaDB ({str(e)}) "
+                                     f"- se divide y se reintenta (lotes de ~{self.batch_bytes} bytes)")
+            middle = len(batch) // 2
+            self.insert(batch[:middle])
+            self.insert(batch[middle:])
+            return
+        
+        elapsed = time.perf_counter() - started
+        self.metrics.add('write', elapsed, len(batch), size)
+        self.tune(size, elapsed)
+        self.batch_written(batch)
+    
+    def recover(self, error):
+        """Reconectar si MariaDB cortó la conexión; los lotes sin commit no se pueden recuperar"""
+        if self.conn.is_connected():
+            return
+        if self.pending:
+            raise Exception(f"Conexión perdida con {self.pending} lotes sin confirmar en '{self.target['table']}' "
+                            f"(reducir SYNC_BATCH_BYTES o usar SYNC_COMMIT=batch): {str(error)}")
+        self.conn.close()
+        self.open()
+    
+    def tune(self, size, elapsed):
+        """Ajustar el tamaño de lote para que cada inserción tarde aproximadamente target_seconds"""
+        # Los lotes chicos (final de un bloque) no son representativos de la velocidad
+        if elapsed <= 0 or size < self.batch_bytes // 4:
+            return
+        ideal = size / elapsed * self.target_seconds
+        ideal = min(max(ideal, self.batch_bytes / 2), self.batch_bytes * 2)
+        self.batch_bytes = int(min(max(ideal, MIN_BATCH_BYTES), self.max_bytes))
+    
+    def batch_written(self, rows):
+        self.pending += 1
+        self.pending_rows += len(rows)
+        self.last_row = rows[-1]
+        if self.commit_every and self.pending >= self.commit_every:
+            self.commit()
+    
+    def commit(self):
+        with self.metrics.measure('commit'):
+            self.conn.commit()
+        if self.on_commit:
+            self.on_commit(self.last_row, self.pending_rows)
+        self.pending = 0
+        self.pending_rows = 0
+    
+    def finish(self):
+        """Confirmar los lotes pendientes al terminar la copia"""
+        if self.pending:
+            self.commit()
+    
+    def close(self):
+        """Devolver la conexión al pool (lo no confirmado se descarta)"""
+        if self.target.get('bulk'):
+            try:
+                self.cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+            except Exception:
+                # Conexión rota: el pool la descarta al fallar el rollback
+                pass
+        self.cursor.close()
+        self.conn.close()
+
+def snapshot_arrow_type(pa, col):
+    """Tipo Arrow con el que se guarda en el snapshot una columna de SQL Server"""
+    data_type = col[1].lower()
+    if data_type in ['tinyint', 'smallint', 'int']:
+        return pa.int32()
+    if data_type == 'bigint':
+        return pa.int64()
+    if data_type == 'bit':
+        return pa.bool_()
+    if data_type in ['decimal', 'numeric']:
+        return pa.decimal128(col[3] or 18, col[4] or 0)
+    if data_type == 'money':
+        return pa.decimal128(19, 4)
+    if data_type == 'smallmoney':
+        return pa.decimal128(10, 4)
+    if data_type == 'float':
+        return pa.float64()
+    if data_type == 'real':
+        return pa.float32()
+    if data_type == 'date':
+        return pa.date32()
+    if data_type in ['datetime', 'datetime2', 'smalldatetime']:
+        return pa.timestamp('us')
+    if data_type in ['binary', 'varbinary', 'image', 'timestamp', 'rowversion']:
+        return pa.binary()
+    return pa.string()
+
+class TableSnapshot:
+    """Snapshot en disco de una recarga completa: bloques en Arrow IPC comprimido, un archivo por flujo de copia"""
+    
+    def __init__(self, directory, table_name, run_id, columns, source_columns, key_columns, indexes, compression):
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+        except ImportError:
+            raise Exception("Los snapshots (SYNC_SNAPSHOT) requieren pyarrow: pip install pyarrow")
+        
+        self.pa = pa
+        self.table_name = table_name
+        self.run_id = run_id
+        self.path = os.path.join(directory, table_name, run_id)
+        self.columns = columns
+        self.source_columns = source_columns
+        self.key_columns = key_columns
+        self.indexes = indexes
+        self.compression = compression
+        self.schema = pa.schema([pa.field(name, snapshot_arrow_type(pa, col)) for name, col in zip(columns, source_columns)])
+        
+        # Columnas sin tipo Arrow propio (time, datetimeoffset, sql_variant...) se guardan como texto
+        text_types = ['char', 'varchar', 'nchar', 'nvarchar', 'text', 'ntext', 'uniqueidentifier']
+        self.converters = [to_optional_str if field.type == pa.string() and col[1].lower() not in text_types else None
+                           for field, col in zip(self.schema, source_columns)]
+        
+        self.parts = []
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+    
+    def open_part(self):
+        with self.lock:
+            filename = f"part-{len(self.parts) + 1:05d}.arrow"
+            part = {'file': filename, 'rows': 0}
+            self.parts.append(part)
+        return SnapshotPart(self, part)
+    
+    def finish(self, rows):
+        """Escribir el manifiesto: solo los snapshots con manifiesto se pueden reproducir"""
+        manifest = {
+            'table': self.table_name,
+            'run_id': self.run_id,
+            'created': datetime.now().isoformat(),
+            'rows': rows,
+            'compression': self.compression,
+            'columns': self.columns,
+            'source_columns': [list(col) for col in self.source_columns],
+            'key_columns': self.key_columns,
+            'indexes': self.indexes,
+            'parts': self.parts
+        }
+        with open(os.path.join(self.path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+
+class SnapshotPart:
+    """Archivo Arrow IPC de un flujo de copia (cada bloque del pipeline es un RecordBatch)"""
+    
+    def __init__(self, snapshot, part):
+        pa = snapshot.pa
+        self.snapshot = snapshot
+        self.part = part
+        self.sink = pa.OSFile(os.path.join(snapshot.path, part['file']), 'wb')
+        options = pa.ipc.IpcWriteOptions(compression=snapshot.compression)
+        self.writer = pa.ipc.new_file(self.sink, snapshot.schema, options=options)
+    
+    def write(self, rows):
+        pa = self.snapshot.pa
+        columns = list(zip(*rows))
+        arrays = []
+        for values, field, convert in zip(columns, self.snapshot.schema, self.snapshot.converters):
+            if convert:
+                values = [convert(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.snapshot.schema))
+        self.part['rows'] += len(rows)
+    
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+class SnapshotReader:
+    """Lectura de los archivos de un snapshot mapeados en memoria, con la interfaz fetchmany de un cursor"""
+    
+    def __init__(self, paths):
+        import pyarrow as pa
+        import pyarrow.ipc
+        self.pa = pa
+        self.paths = list(paths)
+        self.source = None
+        self.reader = None
+        self.batch_index = 0
+    
+    def fetchmany(self, size=None):
+        # Devuelve un RecordBatch por llamada (del tamaño de bloque con el que se extrajo)
+        while True:
+            if self.reader is not None and self.batch_index < self.reader.num_record_batches:
+                batch = self.reader.get_batch(self.batch_index)
+                self.batch_index += 1
+                return list(zip(*[column.to_pylist() for column in batch.columns]))
+            if self.source is not None:
+                self.source.close()
+                self.source = None
+            if not self.paths:
+                return []
+            self.source = self.pa.memory_map(self.paths.pop(0), 'r')
+            self.reader = self.pa.ipc.open_file(self.source)
+            self.batch_index = 0
+    
+    def close(self):
+        if self.source is not None:
+            self.source.close()
 
 class DatabaseSyncronizer:
     def __init__(self):
@@ -49,6 +532,34 @@ class DatabaseSyncronizer:
         # Configuraciones de sincronización
         self.tables_to_sync = os.getenv('TABLES_TO_SYNC', '').split(',')
         self.sync_time = os.getenv('SYNC_TIME', '02:00')
+        self.chunk_size = int(os.getenv('SYNC_CHUNK_SIZE', 5000))
+        self.state_file = os.getenv('SYNC_STATE_FILE', 'state/sync_state.db')
+        self.workers = max(1, int(os.getenv('SYNC_WORKERS', 1)))
+        self.load_data_rejected = False
+        self.max_allowed_packet = None
+        
+        # Métricas de la ejecución en curso y del último reporte (para /metrics)
+        self.report_dir = os.getenv('SYNC_REPORT_DIR', 'logs/reports')
+        self.metrics_port = int(os.getenv('SYNC_METRICS_PORT', 0))
+        self.change_signatures = {}
+        self.thread_state = threading.local()
+        self.reset_run_metrics()
+        self.last_report = None
+        
+        # Snapshots en disco de las recargas completas (para reproducirlos sin leer SQL Server)
+        self.snapshot_dir = os.getenv('SYNC_SNAPSHOT_DIR', 'snapshots')
+        
+        # Pools de conexiones reutilizadas durante toda la ejecución
+        pool_size = int(os.getenv('SYNC_POOL_SIZE', max(2, self.workers * 2)))
+        self.sqlserver_profile = None
+        self.sqlserver_pool = ConnectionPool('SQL Server', self.timed_connect(self.open_sqlserver_connection), pool_size,
+                                             self.check_sqlserver_connection)
+        self.mariadb_pool = ConnectionPool('MariaDB', self.timed_connect(self.open_mariadb_connection), pool_size,
+                                           self.check_mariadb_connection)
+        
+        # Metadata de esquema cargada una vez por ejecución
+        self.schema_lock = threading.Lock()
+        self.reset_schema_metadata()
         
         self.logger.info("Sincronizador inicializado correctamente")
     
@@ -59,7 +570,7 @@ class DatabaseSyncronizer:
         
         logging.basicConfig(
             level=getattr(logging, log_level),
-            format='%(asctime)s - %(levelname)s - %(message)s',
+            format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s',
             handlers=[
                 logging.FileHandler(log_filename, encoding='utf-8'),
                 logging.StreamHandler(sys.stdout)
@@ -67,6 +578,137 @@ class DatabaseSyncronizer:
         )
         self.logger = logging.getLogger(__name__)
     
+    def get_table_setting(self, table_name, key, default=None):
+        """Obtener una configuración por tabla (SYNC_<TABLA>_<CLAVE>) o global (SYNC_<CLAVE>)"""
+        value = os.getenv(f"SYNC_{table_name.upper()}_{key}")
+        if not value:
+            value = os.getenv(f"SYNC_{key}")
+        return value if value else default
+    
+    def reset_run_metrics(self):
+        """Iniciar las métricas de una nueva ejecución"""
+        self.run_metrics = {}
+        self.run_phases = TableMetrics('*')
+        self.metrics_lock = threading.Lock()
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    def current_run_id(self):
+        """Identificador de la ejecución en este hilo (cada tabla programada tiene el suyo)"""
+        return getattr(self.thread_state, 'run_id', None) or self.run_id
+    
+    def get_table_metrics(self, table_name):
+        """Obtener (o crear) las métricas de una tabla en la ejecución actual"""
+        with self.metrics_lock:
+            if table_name not in self.run_metrics:
+                self.run_metrics[table_name] = TableMetrics(table_name)
+            return self.run_metrics[table_name]
+    
+    def current_metrics(self):
+        """Métricas de la tabla que se sincroniza en este hilo (o las generales de la ejecución)"""
+        return getattr(self.thread_state, 'metrics', None) or self.run_phases
+    
+    def estimate_rows_bytes(self, rows, lob_indexes=None):
+        """Estimar los bytes de un bloque a partir de una muestra de hasta 20 filas
+        (las columnas de objetos grandes varían demasiado entre filas: se suman completas)"""
+        if not rows:
+            return 0
+        sample = rows[::max(1, len(rows) // 20)]
+        sample_bytes = 0
+        for row in sample:
+            for value in row:
+                sample_bytes += len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+        if not lob_indexes:
+            return sample_bytes * len(rows) // len(sample)
+        
+        for index in lob_indexes:
+            sample_bytes -= sum([len(row[index]) for row in sample if row[index] is not None])
+        total_bytes = sample_bytes * len(rows) // len(sample)
+        for index in lob_indexes:
+            total_bytes += sum([len(row[index]) for row in rows if row[index] is not None])
+        return total_bytes
+    
+    def build_run_report(self, start_time, end_time, success_count, error_count):
+        """Construir el reporte de la ejecución con las métricas de cada tabla"""
+        # Copia bajo el lock: el programador agrega y quita tablas mientras otras terminan
+        with self.metrics_lock:
+            tables = list(self.run_metrics.values())
+        return {
+            'started': start_time.isoformat(),
+            'finished': end_time.isoformat(),
+            'seconds': round((end_time - start_time).total_seconds(), 3),
+            'success': error_count == 0,
+            'tables_ok': success_count,
+            'tables_failed': error_count,
+            'connections': {pool.name: pool.opened for pool in [self.sqlserver_pool, self.mariadb_pool]},
+            'run_phases': self.run_phases.to_dict()['phases'],
+            'tables': [metrics.to_dict() for metrics in tables]
+        }
+    
+    def write_run_report(self, report, prefix='sync_report'):
+        """Guardar el reporte de la ejecución en JSON"""
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            filename = os.path.join(self.report_dir, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+            self.logger.info(f"Reporte de ejecución guardado en {filename}")
+        except Exception as e:
+            self.logger.warning(f"No se pudo guardar el reporte de ejecución: {str(e)}")
+    
+    def format_prometheus_metrics(self):
+        """Exponer el último reporte en formato de texto de Prometheus"""
+        report = self.last_report
+        lines = []
+        
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP dbsync_{name} {help_text}")
+            lines.append(f"# TYPE dbsync_{name} gauge")
+            for labels, value in samples:
+                label_str = ','.join([f'{key}="{val}"' for key, val in labels.items()])
+                lines.append(f"dbsync_{name}{{{label_str}}} {value}" if label_str else f"dbsync_{name} {value}")
+        
+        if report:
+            metric('last_run_timestamp_seconds', 'Fin de la última sincronización',
+                   [({}, datetime.fromisoformat(report['finished']).timestamp())])
+            metric('last_run_duration_seconds', 'Duración de la última sincronización', [({}, report['seconds'])])
+            metric('last_run_success', 'La última sincronización terminó sin errores', [({}, int(report['success']))])
+            metric('table_rows', 'Registros copiados por tabla', [({'table': t['table']}, t['rows']) for t in report['tables']])
+            metric('table_duration_seconds', 'Duración por tabla', [({'table': t['table']}, t['seconds']) for t in report['tables']])
+            metric('table_success', 'La tabla se sincronizó sin errores',
+                   [({'table': t['table']}, int(t['status'] != 'error')) for t in report['tables']])
+            for field, help_text in [('seconds', 'Tiempo por fase'), ('rows', 'Registros por fase'), ('bytes', 'Bytes estimados por fase')]:
+                samples = []
+                for t in report['tables']:
+                    for phase, totals in t['phases'].items():
+                        samples.append(({'table': t['table'], 'phase': phase}, totals[field]))
+                metric(f'phase_{field}', help_text, samples)
+        
+        return '\n'.join(lines) + '\n'
+    
+    def start_metrics_server(self):
+        """Servir /metrics (formato Prometheus) en un hilo de fondo"""
+        syncronizer = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = syncronizer.format_prometheus_metrics().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('0.0.0.0', self.metrics_port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        self.logger.info(f"Métricas Prometheus disponibles en http://0.0.0.0:{self.metrics_port}/metrics")
+    
     def test_connections(self):
         """Probar las conexiones a ambas bases de datos"""
         self.logger.info("Probando conexiones a las bases de datos...")
@@ -92,7 +734,29 @@ class DatabaseSyncronizer:
         return True
     
     def connect_sqlserver(self):
-        """Conectar a SQL Server"""
+        """Obtener una conexión a SQL Server del pool (close() la devuelve al pool)"""
+        return self.sqlserver_pool.get()
+    
+    def connect_mariadb(self):
+        """Obtener una conexión a MariaDB del pool (close() la devuelve al pool)"""
+        return self.mariadb_pool.get()
+    
+    def timed_connect(self, factory):
+        """Envolver una función de conexión para medir el tiempo de handshake"""
+        def connect():
+            with self.current_metrics().measure('connect'):
+                return factory()
+        return connect
+    
+    def close_connections(self):
+        """Cerrar las conexiones del pool y registrar cuántas se abrieron"""
+        for pool in [self.sqlserver_pool, self.mariadb_pool]:
+            self.logger.info(f"Conexiones abiertas a {pool.name} en esta ejecución: {pool.opened}")
+            pool.close_all()
+            pool.opened = 0
+    
+    def open_sqlserver_connection(self):
+        """Abrir una conexión nueva a SQL Server"""
         # Intentar diferentes configuraciones de conexión
         connection_configs = [
             # Configuración 1: Microsoft ODBC Driver 17 - Sin cifrado
@@ -127,65 +791,365 @@ class DatabaseSyncronizer:
             "PYMSSQL_NATIVE"
         ]
         
-        for i, connection_string in enumerate(connection_configs, 1):
+        # Probar primero la configuración que ya funcionó en esta ejecución
+        order = list(range(len(connection_configs)))
+        if self.sqlserver_profile is not None:
+            order.remove(self.sqlserver_profile)
+            order.insert(0, self.sqlserver_profile)
+        
+        for attempt, index in enumerate(order, 1):
+            connection_string = connection_configs[index]
+            i = index + 1
             try:
-                self.logger.info(f"Intentando configuración {i} de conexión...")
+                if self.sqlserver_profile != index:
+                    self.logger.info(f"Intentando configuración {i} de conexión...")
                 
                 # Configuración especial para pymssql
                 if connection_string == "PYMSSQL_NATIVE":
-                    self.logger.info("Usando pymssql...")
-                    return pymssql.connect(
+                    if self.sqlserver_profile != index:
+                        self.logger.info("Usando pymssql...")
+                    conn = pymssql.connect(
                         server=self.sqlserver_config['host'],
                         port=int(self.sqlserver_config['port']),
                         user=self.sqlserver_config['username'],
                         password=self.sqlserver_config['password'],
                         database=self.sqlserver_config['database'],
-                        timeout=15
+                        login_timeout=15
                     )
                 else:
                     # Configuraciones ODBC
                     self.logger.debug(f"Cadena de conexión: {connection_string.replace(self.sqlserver_config['password'], '***')}")
-                    return pyodbc.connect(connection_string, timeout=15)
+                    conn = pyodbc.connect(connection_string, timeout=15)
+                
+                self.sqlserver_profile = index
+                return conn
                     
             except Exception as e:
                 self.logger.warning(f"Configuración {i} falló: {str(e)}")
-                if i == len(connection_configs):
+                if attempt == len(order):
                     raise e
                 continue
     
-    def connect_mariadb(self):
-        """Conectar a MariaDB"""
+    def check_sqlserver_connection(self, conn):
+        """Verificar una conexión a SQL Server antes de reutilizarla (falla si está cerrada)"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        finally:
+            cursor.close()
+    
+    def check_mariadb_connection(self, conn):
+        """Verificar una conexión a MariaDB antes de reutilizarla (falla si está cerrada)"""
+        conn.ping(reconnect=False)
+    
+    def open_mariadb_connection(self):
+        """Abrir una conexión nueva a MariaDB"""
         return mysql.connector.connect(
             host=self.mariadb_config['host'],
             port=self.mariadb_config['port'],
             database=self.mariadb_config['database'],
             user=self.mariadb_config['username'],
             password=self.mariadb_config['password'],
-            charset='utf8mb4'
+            charset='utf8mb4',
+            # LOAD DATA LOCAL solo puede leer los archivos temporales generados por el sincronizador
+            allow_local_infile_in_path=tempfile.gettempdir()
         )
     
+    def reset_schema_metadata(self):
+        """Vaciar la metadata de esquema en memoria"""
+        self.schema = {
+            'loaded': set(),     # Tablas ya consultadas (en mayúsculas)
+            'sqlserver': {},     # Tabla -> columnas de SQL Server
+            'keys': {},          # Tabla -> columnas de la clave primaria en SQL Server
+            'indexes': {},       # Tabla -> índices secundarios de SQL Server
+            'rows': {},          # Tabla -> filas estimadas según sys.partitions
+            'mariadb': {}        # Tabla -> [(columna, tipo)] en MariaDB
+        }
+    
+    def load_schema_metadata(self, tables):
+        """Cargar la metadata de columnas de varias tablas con una sola consulta por servidor"""
+        tables = [table_name for table_name in tables if table_name]
+        if not tables:
+            return
+        
+        by_upper = {table_name.upper(): table_name for table_name in tables}
+        names_str = ', '.join([f"'{table_name}'" for table_name in tables])
+        
+        sqlserver = {}
+        indexes = {}
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                c.TABLE_NAME,
+                c.COLUMN_NAME,
+                c.DATA_TYPE,
+                c.CHARACTER_MAXIMUM_LENGTH,
+                c.NUMERIC_PRECISION,
+                c.NUMERIC_SCALE,
+                c.IS_NULLABLE,
+                c.COLUMN_DEFAULT
+            FROM INFORMATION_SCHEMA.COLUMNS c
+            WHERE c.TABLE_NAME IN ({names_str})
+            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """)
+        for row in cursor.fetchall():
+            table_name = by_upper.get(row[0].upper(), row[0])
+            sqlserver.setdefault(table_name, []).append(tuple(row[1:8]))
+        
+        # Clave primaria e índices (agrupados y no agrupados; sin filtrados, deshabilitados ni columnas INCLUDE)
+        cursor.execute(f"""
+            SELECT t.name, i.name, i.is_primary_key, i.is_unique, c.name
+            FROM sys.indexes i
+            JOIN sys.tables t ON t.object_id = i.object_id
+            JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE t.name IN ({names_str})
+                AND i.type IN (1, 2) AND i.is_disabled = 0 AND i.is_hypothetical = 0 AND i.has_filter = 0
+                AND ic.is_included_column = 0
+            ORDER BY t.name, i.index_id, ic.key_ordinal
+        """)
+        for source_table, index_name, is_primary, is_unique, column_name in cursor.fetchall():
+            table_name = by_upper.get(source_table.upper(), source_table)
+            table_indexes = indexes.setdefault(table_name, {})
+            if index_name not in table_indexes:
+                table_indexes[index_name] = {'name': index_name, 'primary': bool(is_primary),
+                                             'unique': bool(is_unique), 'columns': []}
+            table_indexes[index_name]['columns'].append(column_name)
+        
+        # Existencia y filas estimadas desde el catálogo (montón o índice agrupado), sin recorrer las tablas
+        cursor.execute(f"""
+            SELECT t.name, SUM(p.rows)
+            FROM sys.tables t
+            JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+            WHERE t.name IN ({names_str})
+            GROUP BY t.name
+        """)
+        rows = {by_upper.get(source_table.upper(), source_table): int(estimate or 0)
+                for source_table, estimate in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        
+        mariadb = self.query_target_columns(tables)
+        
+        with self.schema_lock:
+            for table_name in tables:
+                self.schema['loaded'].add(table_name.upper())
+                table_indexes = list(indexes.get(table_name, {}).values())
+                primary = [index for index in table_indexes if index['primary']]
+                self.schema['keys'][table_name] = primary[0]['columns'] if primary else []
+                # Solo las columnas configuradas para copiar; los índices sobre columnas excluidas no se crean
+                columns = self.project_source_columns(table_name, sqlserver.get(table_name, []), self.schema['keys'][table_name])
+                names = set([col[0].lower() for col in columns])
+                self.schema['sqlserver'][table_name] = columns
+                self.schema['indexes'][table_name] = [index for index in table_indexes if not index['primary']
+                                                      and all([col.lower() in names for col in index['columns']])]
+                self.schema['rows'][table_name] = rows.get(table_name)
+                self.schema['mariadb'][table_name] = mariadb.get(table_name)
+        
+        self.logger.info(f"Metadata de esquema cargada para {len(tables)} tablas")
+    
+    def project_source_columns(self, table_name, columns, key_columns):
+        """Aplicar SYNC_<TABLA>_COLUMNS / SYNC_<TABLA>_EXCLUDE_COLUMNS (la clave y las columnas de control se conservan)"""
+        include = self.get_table_setting(table_name, 'COLUMNS')
+        exclude = self.get_table_setting(table_name, 'EXCLUDE_COLUMNS')
+        if not include and not exclude or not columns:
+            return columns
+        
+        include = set([col.strip().lower() for col in (include or '').split(',') if col.strip()])
+        exclude = set([col.strip().lower() for col in (exclude or '').split(',') if col.strip()])
+        required = set([col.lower() for col in key_columns])
+        for setting in ['KEY', 'WATERMARK', 'PARTITION_COLUMN']:
+            required.update([col.strip().lower() for col in (self.get_table_setting(table_name, setting) or '').split(',') if col.strip()])
+        
+        existing = set([col[0].lower() for col in columns])
+        unknown = sorted((include | exclude) - existing)
+        if unknown:
+            self.logger.warning(f"Columnas configuradas que no existen en '{table_name}': {unknown}")
+        kept_required = sorted(existing & ((exclude & required) | (required - include if include else set())))
+        if kept_required:
+            self.logger.warning(f"Columnas de clave o de control que se copian igualmente en '{table_name}': {kept_required}")
+        
+        return [col for col in columns
+                if col[0].lower() in required or ((not include or col[0].lower() in include) and col[0].lower() not in exclude)]
+    
+    def get_row_filter(self, table_name):
+        """Condición SYNC_<TABLA>_WHERE que limita las filas leídas de SQL Server (lista vacía si no hay)"""
+        condition = self.get_table_setting(table_name, 'WHERE')
+        return [condition.strip()] if condition and condition.strip() else []
+    
+    def query_target_columns(self, tables):
+        """Columnas de varias tablas de MariaDB en una sola consulta: {tabla: [(columna, tipo)]}"""
+        # Sin distinguir mayúsculas: con lower_case_table_names=1 MariaDB guarda los nombres en minúsculas
+        by_upper = {table_name.upper(): table_name for table_name in tables}
+        names_str = ', '.join([f"'{table_name}'" for table_name in by_upper])
+        mariadb = {}
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = '{self.mariadb_config['database']}' AND UPPER(TABLE_NAME) IN ({names_str})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """)
+        for target_table, column_name, column_type in cursor.fetchall():
+            table_name = by_upper.get(target_table.upper(), target_table)
+            mariadb.setdefault(table_name, []).append((column_name, column_type))
+        cursor.close()
+        conn.close()
+        return mariadb
+    
+    def ensure_schema_metadata(self, table_name):
+        """Cargar la metadata de una tabla si todavía no está en memoria"""
+        if table_name.upper() not in self.schema['loaded']:
+            self.load_schema_metadata([table_name])
+    
+    def get_source_columns(self, table_name):
+        """Columnas de SQL Server: (nombre, tipo, longitud, precisión, escala, nullable, default)"""
+        self.ensure_schema_metadata(table_name)
+        return self.schema['sqlserver'].get(table_name, [])
+    
+    def get_source_key_columns(self, table_name):
+        """Columnas de la clave primaria en SQL Server"""
+        self.ensure_schema_metadata(table_name)
+        return self.schema['keys'].get(table_name, [])
+    
+    def get_source_indexes(self, table_name):
+        """Índices secundarios de SQL Server: [{'name', 'unique', 'columns'}]"""
+        self.ensure_schema_metadata(table_name)
+        return self.schema['indexes'].get(table_name, [])
+    
+    def get_target_columns(self, table_name):
+        """Columnas de la tabla en MariaDB como [(nombre, tipo)], o None si no existe"""
+        self.ensure_schema_metadata(table_name)
+        return self.schema['mariadb'].get(table_name)
+    
+    def set_target_columns(self, table_name, columns):
+        """Actualizar la metadata de MariaDB después de un cambio de DDL"""
+        with self.schema_lock:
+            self.schema['loaded'].add(table_name.upper())
+            self.schema['mariadb'][table_name] = columns
+    
+    def get_schema_fingerprint(self, table_name, key_columns=None):
+        """Huella del esquema de origen (y de la clave usada) con la que se construye la tabla destino"""
+        definition = {
+            'columns': [list(col) for col in self.get_source_columns(table_name)],
+            'key': key_columns or self.get_source_key_columns(table_name),
+            'indexes': self.get_source_indexes(table_name)
+        }
+        if self.get_row_filter(table_name):
+            # Con filtro de filas la tabla destino solo contiene ese subconjunto: cambiarlo obliga a recargar
+            definition['filter'] = self.get_row_filter(table_name)
+        payload = json.dumps(definition, default=str, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    
+    def load_schema_snapshot(self, table_name):
+        """Leer la huella de esquema con la que se creó la tabla en MariaDB"""
+        conn = self.connect_state_store()
+        try:
+            row = conn.execute(
+                "SELECT fingerprint FROM schema_snapshots WHERE table_name = ?", (table_name,)
+            ).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    
+    def save_schema_snapshot(self, table_name, fingerprint):
+        """Guardar la huella y la estructura de origen con la que se creó la tabla en MariaDB"""
+        columns_json = json.dumps([list(col) for col in self.get_source_columns(table_name)], default=str)
+        conn = self.connect_state_store()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_snapshots (table_name, fingerprint, columns_json, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (table_name, fingerprint, columns_json, datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def prepare_target_table(self, table_name, key_columns=None):
+        """Preparar la tabla vacía donde se cargarán los datos y devolver su nombre"""
+        fingerprint = self.get_schema_fingerprint(table_name, key_columns)
+        
+        if self.get_table_setting(table_name, 'SHADOW_SWAP', 'false').lower() in ['1', 'true', 'yes']:
+            # Cargar en una tabla sombra: la tabla publicada no se toca hasta el RENAME final
+            shadow_table = f"{table_name}__sync_new"
+            conn = self.connect_mariadb()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS `{shadow_table}`")
+            conn.commit()
+            cursor.close()
+            conn.close()
+            self.set_target_columns(shadow_table, None)
+            
+            self.create_table_if_not_exists(table_name, shadow_table, key_columns)
+            self.logger.info(f"Cargando '{table_name}' en la tabla sombra '{shadow_table}'")
+            return shadow_table
+        
+        if self.mariadb_table_exists(table_name) and self.load_schema_snapshot(table_name) == fingerprint:
+            conn = self.connect_mariadb()
+            cursor = conn.cursor()
+            cursor.execute(f"TRUNCATE TABLE `{table_name}`")
+            conn.commit()
+            cursor.close()
+            conn.close()
+            self.drop_secondary_indexes(table_name, table_name)
+            self.logger.info(f"Esquema de '{table_name}' sin cambios ({fingerprint}) - tabla vaciada sin recrear")
+            return table_name
+        
+        # Eliminar y recrear tabla para máxima compatibilidad
+        self.drop_and_recreate_table(table_name, key_columns)
+        self.save_schema_snapshot(table_name, fingerprint)
+        return table_name
+    
+    def swap_shadow_table(self, table_name, shadow_table, key_columns=None):
+        """Publicar la tabla sombra de forma atómica con RENAME TABLE"""
+        old_table = f"{table_name}__sync_old"
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS `{old_table}`")
+        if self.mariadb_table_exists(table_name):
+            cursor.execute(f"RENAME TABLE `{table_name}` TO `{old_table}`, `{shadow_table}` TO `{table_name}`")
+            cursor.execute(f"DROP TABLE `{old_table}`")
+        else:
+            cursor.execute(f"RENAME TABLE `{shadow_table}` TO `{table_name}`")
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        self.set_target_columns(table_name, self.get_target_columns(shadow_table))
+        self.set_target_columns(shadow_table, None)
+        self.save_schema_snapshot(table_name, self.get_schema_fingerprint(table_name, key_columns))
+        self.logger.info(f"Tabla sombra '{shadow_table}' publicada como '{table_name}'")
+    
+    def drop_shadow_table(self, shadow_table):
+        """Descartar una tabla sombra después de una carga fallida"""
+        try:
+            conn = self.connect_mariadb()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS `{shadow_table}`")
+            conn.commit()
+            cursor.close()
+            conn.close()
+            self.set_target_columns(shadow_table, None)
+            self.logger.info(f"Tabla sombra '{shadow_table}' descartada - se conservan los datos anteriores")
+        except Exception as e:
+            self.logger.warning(f"No se pudo eliminar la tabla sombra '{shadow_table}': {str(e)}")
+    
     def get_table_structure(self, table_name, connection_type='sqlserver'):
         """Obtener la estructura de una tabla"""
+        # pandas solo se usa en estos auxiliares: se importa al necesitarlo para no demorar cada ejecución
+        import pandas as pd
+        
         if connection_type == 'sqlserver':
-            conn = self.connect_sqlserver()
-            query = f"""
-            SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH
-            FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = '{table_name}'
-            ORDER BY ORDINAL_POSITION
-            """
-        else:  # mariadb
-            conn = self.connect_mariadb()
-            query = f"""
-            SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH
-            FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = '{table_name}' AND TABLE_SCHEMA = '{self.mariadb_config['database']}'
-            ORDER BY ORDINAL_POSITION
-            """
-        
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+            rows = [(col[0], col[1], col[5], col[2]) for col in self.get_source_columns(table_name)]
+            return pd.DataFrame(rows, columns=['COLUMN_NAME', 'DATA_TYPE', 'IS_NULLABLE', 'CHARACTER_MAXIMUM_LENGTH'])
+        
+        # mariadb
+        rows = self.get_target_columns(table_name) or []
+        return pd.DataFrame(rows, columns=['COLUMN_NAME', 'COLUMN_TYPE'])
     
     def map_sql_type_to_mysql(self, sql_type, column_length=None):
         """Mapear tipos de SQL Server a MySQL/MariaDB con optimizaciones"""
@@ -241,6 +1205,8 @@ class DatabaseSyncronizer:
     
     def clean_dataframe(self, df):
         """Limpiar DataFrame antes de insertar"""
+        import pandas as pd
+        
         # Reemplazar valores NaN/None con None para MySQL
         df = df.where(pd.notnull(df), None)
         
@@ -292,27 +1258,7 @@ class DatabaseSyncronizer:
     def get_optimized_table_structure(self, table_name):
         """Obtener estructura optimizada de tabla desde SQL Server"""
         try:
-            conn = self.connect_sqlserver()
-            cursor = conn.cursor()
-            
-            # Obtener estructura completa
-            cursor.execute(f"""
-                SELECT 
-                    COLUMN_NAME,
-                    DATA_TYPE,
-                    CHARACTER_MAXIMUM_LENGTH,
-                    NUMERIC_PRECISION,
-                    NUMERIC_SCALE,
-                    IS_NULLABLE,
-                    COLUMN_DEFAULT
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = '{table_name}'
-                ORDER BY ORDINAL_POSITION
-            """)
-            
-            columns = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            columns = self.get_source_columns(table_name)
             
             # Limpiar nombres de columnas
             cleaned_columns = []
@@ -327,7 +1273,7 @@ class DatabaseSyncronizer:
             self.logger.error(f"Error obteniendo estructura de tabla '{table_name}': {str(e)}")
             return None
     
-    def drop_and_recreate_table(self, table_name):
+    def drop_and_recreate_table(self, table_name, key_columns=None):
         """Eliminar y recrear tabla para máxima compatibilidad"""
         try:
             # Eliminar tabla si existe
@@ -340,92 +1286,91 @@ class DatabaseSyncronizer:
             
             cursor.close()
             mariadb_conn.close()
+            self.set_target_columns(table_name, None)
             
             # Crear tabla nueva
-            self.create_table_if_not_exists(table_name)
+            self.create_table_if_not_exists(table_name, key_columns=key_columns)
             
         except Exception as e:
             self.logger.error(f"Error eliminando tabla '{table_name}': {str(e)}")
             raise
 
-    def create_table_if_not_exists(self, table_name):
-        """Crear tabla en MariaDB si no existe, con optimizaciones"""
+    def map_target_type(self, col):
+        """Tipo de MariaDB con el que se crea una columna de SQL Server"""
+        data_type = col[1].upper()
+        length = col[2]
+        precision = col[3]
+        scale = col[4]
+        
+        if data_type in ['VARCHAR', 'NVARCHAR'] and length == -1:
+            col_type = "LONGTEXT"  # (n)varchar(max)
+        elif data_type in ['VARCHAR', 'NVARCHAR', 'CHAR', 'NCHAR']:
+            length = min(length or 255, 255)  # Limitar a 255 caracteres
+            col_type = f"VARCHAR({length})"
+        elif data_type in ['TEXT', 'NTEXT', 'XML']:
+            col_type = "LONGTEXT"
+        elif data_type == 'IMAGE' or (data_type == 'VARBINARY' and length == -1):
+            col_type = "LONGBLOB"
+        elif data_type in ['VARBINARY', 'BINARY']:
+            col_type = f"{data_type}({length})" if length and length <= 255 else "BLOB"
+        elif data_type == 'DECIMAL':
+            precision = min(precision or 10, 10)  # Limitar precisión
+            scale = min(scale or 2, 2)  # Limitar escala
+            col_type = f"DECIMAL({precision},{scale})"
+        elif data_type == 'FLOAT':
+            col_type = "FLOAT"
+        elif data_type == 'DATETIME':
+            col_type = "DATETIME"
+        elif data_type == 'DATE':
+            col_type = "DATE"
+        elif data_type == 'BIT':
+            col_type = "TINYINT(1)"
+        elif data_type == 'INT':
+            col_type = "INT"
+        elif data_type == 'BIGINT':
+            col_type = "BIGINT"
+        elif data_type in ['TIMESTAMP', 'ROWVERSION']:
+            col_type = "BINARY(8)"
+        else:
+            col_type = "VARCHAR(255)"  # Tipo por defecto
+        return col_type
+    
+    def create_table_if_not_exists(self, table_name, target_name=None, key_columns=None):
+        """Crear tabla en MariaDB si no existe, con la clave primaria de SQL Server (o la indicada)"""
+        target_name = target_name or table_name
+        key_columns = key_columns or self.get_source_key_columns(table_name)
         try:
             # Verificar si la tabla ya existe
-            mariadb_conn = self.connect_mariadb()
-            cursor = mariadb_conn.cursor()
-            
-            cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-            if cursor.fetchone():
-                cursor.close()
-                mariadb_conn.close()
-                self.logger.info(f"Tabla '{table_name}' ya existe en MariaDB")
+            if self.mariadb_table_exists(target_name):
+                self.logger.info(f"Tabla '{target_name}' ya existe en MariaDB")
                 return
             
-            # Obtener estructura optimizada de SQL Server
-            sqlserver_conn = self.connect_sqlserver()
-            cursor_sql = sqlserver_conn.cursor()
-            
-            # Obtener estructura completa
-            cursor_sql.execute(f"""
-                SELECT 
-                    COLUMN_NAME,
-                    DATA_TYPE,
-                    CHARACTER_MAXIMUM_LENGTH,
-                    NUMERIC_PRECISION,
-                    NUMERIC_SCALE,
-                    IS_NULLABLE,
-                    COLUMN_DEFAULT
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = '{table_name}'
-                ORDER BY ORDINAL_POSITION
-            """)
-            
-            columns = cursor_sql.fetchall()
-            cursor_sql.close()
-            sqlserver_conn.close()
+            # Obtener estructura de SQL Server desde la metadata en memoria
+            columns = self.get_source_columns(table_name)
             
             if not columns:
                 raise Exception(f"No se pudo obtener la estructura de la tabla '{table_name}'")
             
+            # Las columnas de texto de la clave y de los índices únicos se comparan como en un origen sensible a
+            # mayúsculas: con la intercalación por defecto de MariaDB 'abc' y 'ABC' serían la misma clave
+            unique_columns = set([self.clean_column_name(col) for col in key_columns or []])
+            for index in self.get_source_indexes(table_name):
+                if index['unique']:
+                    unique_columns.update([self.clean_column_name(col) for col in index['columns']])
+            
             # Construir definición de columnas
             column_defs = []
+            target_columns = []
             for col in columns:
                 col_name = self.clean_column_name(col[0])
-                data_type = col[1].upper()
-                length = col[2]
-                precision = col[3]
-                scale = col[4]
+                col_type = self.map_target_type(col)
                 is_nullable = col[5]
                 default = col[6]
                 
-                # Mapear tipos de datos
-                if data_type in ['VARCHAR', 'NVARCHAR', 'CHAR', 'NCHAR']:
-                    length = min(length or 255, 255)  # Limitar a 255 caracteres
-                    col_type = f"VARCHAR({length})"
-                elif data_type in ['TEXT', 'NTEXT']:
-                    col_type = "TEXT"
-                elif data_type == 'DECIMAL':
-                    precision = min(precision or 10, 10)  # Limitar precisión
-                    scale = min(scale or 2, 2)  # Limitar escala
-                    col_type = f"DECIMAL({precision},{scale})"
-                elif data_type == 'FLOAT':
-                    col_type = "FLOAT"
-                elif data_type == 'DATETIME':
-                    col_type = "DATETIME"
-                elif data_type == 'DATE':
-                    col_type = "DATE"
-                elif data_type == 'BIT':
-                    col_type = "TINYINT(1)"
-                elif data_type == 'INT':
-                    col_type = "INT"
-                elif data_type == 'BIGINT':
-                    col_type = "BIGINT"
-                else:
-                    col_type = "VARCHAR(255)"  # Tipo por defecto
-                
                 # Construir definición de columna
                 col_def = f"`{col_name}` {col_type}"
+                if col_type.startswith('VARCHAR') and col_name in unique_columns:
+                    col_def += " CHARACTER SET utf8mb4 COLLATE utf8mb4_bin"
                 if is_nullable == 'NO':
                     col_def += " NOT NULL"
                 if default is not None:
@@ -437,49 +1382,103 @@ class DatabaseSyncronizer:
                         col_def += f" DEFAULT {default}"
                 
                 column_defs.append(col_def)
+                target_columns.append((col_name, col_type))
+            
+            # La clave primaria se crea con la tabla; los índices secundarios, después de la carga
+            problem = self.get_key_problem(table_name, key_columns, dict(target_columns)) if key_columns else None
+            if problem:
+                # Una clave sobre valores recortados rechazaría filas que en SQL Server son distintas
+                self.logger.warning(f"Tabla '{target_name}' creada sin la clave primaria ({', '.join(key_columns)}): {problem}")
+            elif key_columns:
+                column_defs.append(f"PRIMARY KEY ({', '.join([f'`{self.clean_column_name(col)}`' for col in key_columns])})")
             
             # Crear tabla
-            create_table_sql = f"CREATE TABLE `{table_name}` (\n  " + ",\n  ".join(column_defs) + "\n)"
+            create_table_sql = f"CREATE TABLE `{target_name}` (\n  " + ",\n  ".join(column_defs) + "\n)"
             self.logger.debug(f"SQL para crear tabla:\n{create_table_sql}")
             
+            mariadb_conn = self.connect_mariadb()
+            cursor = mariadb_conn.cursor()
             cursor.execute(create_table_sql)
             mariadb_conn.commit()
             
             cursor.close()
             mariadb_conn.close()
+            self.set_target_columns(target_name, target_columns)
             
-            self.logger.info(f"Tabla '{table_name}' creada/verificada en MariaDB")
+            self.logger.info(f"Tabla '{target_name}' creada/verificada en MariaDB")
             
         except Exception as e:
             self.logger.error(f"Error creando tabla '{table_name}': {str(e)}")
             raise
     
+    def get_key_problem(self, table_name, key_columns, target_types=None):
+        """Motivo por el que una clave única no se puede crear en MariaDB sin rechazar filas válidas (None si se puede)"""
+        source_columns = {self.clean_column_name(col[0]): col for col in self.get_source_columns(table_name)}
+        if target_types is None:
+            target_types = {name: self.map_target_type(col) for name, col in source_columns.items()}
+        key_bytes = 0
+        for column in [self.clean_column_name(col) for col in key_columns]:
+            col = source_columns.get(column)
+            target_type = (target_types.get(column) or '').upper()
+            if col is None or not target_type:
+                return f"la columna '{column}' no existe"
+            data_type, length, precision, scale = col[1].lower(), col[2], col[3], col[4]
+            if any([kind in target_type for kind in ['TEXT', 'BLOB']]):
+                return f"'{column}' es un objeto grande ({target_type})"
+            if data_type in ['char', 'varchar', 'nchar', 'nvarchar'] and (length == -1 or (length or 0) > 255):
+                return f"'{column}' ({data_type}({length})) se recorta a {target_type}"
+            if data_type == 'decimal' and ((precision or 0) > 10 or (scale or 0) > 2):
+                return f"'{column}' (decimal({precision},{scale})) se recorta a {target_type}"
+            if data_type in ['datetime', 'float']:
+                return f"'{column}' ({data_type}) pierde precisión como {target_type}"
+            
+            # Bytes de la columna en el índice: utf8mb4 reserva 4 por carácter
+            match = re.match(r'(VAR)?(CHAR|BINARY)\((\d+)\)', target_type)
+            if match:
+                key_bytes += int(match.group(3)) * (4 if match.group(2) == 'CHAR' else 1) + 2
+            else:
+                key_bytes += {'TINYINT': 1, 'SMALLINT': 2, 'DATE': 3, 'INT': 4}.get(target_type.split('(')[0], 8)
+        if key_bytes > MAX_KEY_BYTES:
+            return f"ocupa {key_bytes} bytes, más que el máximo de {MAX_KEY_BYTES} de MariaDB"
+        return None
+    
     def validate_table_exists(self, table_name):
         """Validar si la tabla existe en SQL Server"""
         try:
-            conn = self.connect_sqlserver()
-            cursor = conn.cursor()
-            
-            # Query para verificar si la tabla existe
-            query = "SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = '%s'" % table_name
-            cursor.execute(query)
-            result = cursor.fetchone()
-            
-            cursor.close()
-            conn.close()
-            
-            return result[0] > 0
+            return len(self.get_source_columns(table_name)) > 0
             
         except Exception as e:
             self.logger.error(f"Error validando tabla '{table_name}': {str(e)}")
             return False
 
+    def get_estimated_row_count(self, table_name):
+        """Filas estimadas de la tabla según el catálogo de SQL Server (None si no se conocen)"""
+        self.ensure_schema_metadata(table_name)
+        return self.schema['rows'].get(table_name)
+    
     def get_table_row_count(self, table_name):
-        """Obtener número de registros de una tabla"""
+        """Obtener número de registros de una tabla (estimado del catálogo salvo con SYNC_EXACT_COUNTS)"""
         try:
+            exact = self.get_table_setting(table_name, 'EXACT_COUNTS', 'false').lower() in ['1', 'true', 'yes']
+            estimate = None if exact else self.get_estimated_row_count(table_name)
+            if estimate:
+                return estimate
+            
             conn = self.connect_sqlserver()
             cursor = conn.cursor()
             
+            if estimate == 0:
+                # El catálogo dice que está vacía: se confirma leyendo una sola fila en vez de contar
+                cursor.execute(f"SELECT TOP 1 1 FROM [{table_name}]")
+                result = cursor.fetchone()
+                if result:
+                    self.logger.info(f"Estadísticas de '{table_name}' desactualizadas - se cuentan los registros")
+                    cursor.execute(f"SELECT COUNT(*) FROM [{table_name}]")
+                    result = cursor.fetchone()
+                cursor.close()
+                conn.close()
+                return result[0] if result else 0
+            
             query = f"SELECT COUNT(*) FROM [{table_name}]"
             cursor.execute(query)
             result = cursor.fetchone()
@@ -493,92 +1492,1436 @@ class DatabaseSyncronizer:
             self.logger.error(f"Error contando registros en '{table_name}': {str(e)}")
             return 0
 
-    def sync_table(self, table_name):
-        """Sincronizar una tabla específica con mejoras"""
+    def connect_state_store(self):
+        """Conectar al almacén de estado local (SQLite)"""
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        
+        conn = sqlite3.connect(self.state_file, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                table_name TEXT PRIMARY KEY,
+                column_name TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS diff_state (
+                table_name TEXT PRIMARY KEY,
+                key_column TEXT NOT NULL,
+                cuts_json TEXT NOT NULL,
+                checksums_json TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_snapshots (
+                table_name TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                columns_json TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                table_name TEXT NOT NULL,
+                part INTEGER NOT NULL,
+                load_table TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                key_columns_json TEXT NOT NULL,
+                range_condition TEXT NOT NULL,
+                last_key_json TEXT,
+                rows INTEGER NOT NULL,
+                done INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (table_name, part)
+            )
+        """)
+        return conn
+
+    def load_watermark(self, table_name):
+        """Leer la última marca de agua guardada para una tabla"""
+        conn = self.connect_state_store()
         try:
-            self.logger.info(f"Iniciando sincronización de tabla: {table_name}")
-            
-            # Validar que la tabla existe
-            if not self.validate_table_exists(table_name):
-                self.logger.warning(f"⚠️ Tabla '{table_name}' no existe en SQL Server - OMITIDA")
-                return
-            
-            # Verificar si tiene datos
-            row_count = self.get_table_row_count(table_name)
-            if row_count == 0:
-                self.logger.info(f"ℹ️ Tabla '{table_name}' está vacía - OMITIDA")
-                return
-                
-            self.logger.info(f"📊 Tabla '{table_name}' tiene {row_count} registros")
-            
-            # Mostrar estructura en SQL Server
-            sqlserver_conn = self.connect_sqlserver()
-            cursor = sqlserver_conn.cursor()
-            cursor.execute(f"SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{table_name}' ORDER BY ORDINAL_POSITION")
-            columns = cursor.fetchall()
-            self.logger.info(f"Estructura en SQL Server para '{table_name}':")
-            for col in columns:
-                self.logger.info(f"  - {col[0]} ({col[1]}{', ' + str(col[2]) if col[2] else ''})")
-            cursor.close()
-            sqlserver_conn.close()
-            
-            # Eliminar y recrear tabla para máxima compatibilidad
-            self.drop_and_recreate_table(table_name)
-            
-            # Mostrar estructura en MariaDB
-            mariadb_conn = self.connect_mariadb()
-            cursor = mariadb_conn.cursor()
-            cursor.execute(f"DESCRIBE `{table_name}`")
-            columns = cursor.fetchall()
-            self.logger.info(f"Estructura en MariaDB para '{table_name}':")
-            for col in columns:
-                self.logger.info(f"  - {col[0]} ({col[1]})")
-            cursor.close()
-            mariadb_conn.close()
+            return conn.execute(
+                "SELECT column_name, value_type, value FROM watermarks WHERE table_name = ?",
+                (table_name,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+    def save_watermark(self, table_name, column_name, value):
+        """Guardar la marca de agua alcanzada por una tabla"""
+        if isinstance(value, (bytes, bytearray)):
+            value_type, stored_value = 'binary', bytes(value).hex()
+        elif isinstance(value, date):
+            value_type, stored_value = 'datetime', value.isoformat()
+        else:
+            value_type, stored_value = 'number', str(value)
+        
+        conn = self.connect_state_store()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO watermarks (table_name, column_name, value_type, value, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (table_name, column_name, value_type, stored_value, datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self.logger.info(f"Marca de agua de '{table_name}' actualizada: {column_name} = {stored_value}")
+
+    def encode_value(self, value):
+        """Serializar un valor de clave conservando su tipo para guardarlo en el estado"""
+        if isinstance(value, datetime):
+            return ['datetime', value.isoformat()]
+        if isinstance(value, date):
+            return ['date', value.isoformat()]
+        if isinstance(value, Decimal):
+            return ['decimal', str(value)]
+        if isinstance(value, (bytes, bytearray)):
+            return ['binary', bytes(value).hex()]
+        if isinstance(value, (int, float)):
+            return [type(value).__name__, repr(value)]
+        return ['str', str(value)]
+
+    def decode_value(self, encoded):
+        """Recuperar un valor guardado con encode_value"""
+        value_type, value = encoded
+        decoders = {
+            'datetime': datetime.fromisoformat,
+            'date': date.fromisoformat,
+            'decimal': Decimal,
+            'binary': bytes.fromhex,
+            'int': int,
+            'float': float,
+            'str': str
+        }
+        return decoders[value_type](value)
+
+    def watermark_predicate(self, column_name, value_type, value):
+        """Construir la condición WHERE para leer solo filas posteriores a la marca de agua"""
+        if value_type == 'binary':
+            # rowversion: único y creciente, basta con estrictamente mayor
+            return f"[{column_name}] > 0x{value}"
+        if value_type == 'datetime':
+            # Fechas de modificación pueden repetirse: se relee el último instante (el upsert es idempotente)
+            return f"[{column_name}] >= CONVERT(DATETIME2, '{value}', 126)"
+        return f"[{column_name}] > {float(value) if '.' in value else int(value)}"
+
+    def load_checkpoints(self, table_name, key_columns):
+        """Leer el avance registrado de una recarga interrumpida (None si no se puede reanudar)"""
+        conn = self.connect_state_store()
+        try:
+            rows = conn.execute(
+                "SELECT part, load_table, fingerprint, key_columns_json, range_condition, last_key_json, rows, done "
+                "FROM checkpoints WHERE table_name = ? ORDER BY part", (table_name,)
+            ).fetchall()
+        finally:
+            conn.close()
+        
+        if not rows:
+            return None
+        
+        parts = []
+        for part, load_table, fingerprint, key_columns_json, range_condition, last_key_json, rows_copied, done in rows:
+            parts.append({
+                'part': part,
+                'load_table': load_table,
+                'fingerprint': fingerprint,
+                'key_columns': json.loads(key_columns_json),
+                'condition': range_condition or None,
+                'last_key': [self.decode_value(value) for value in json.loads(last_key_json)] if last_key_json else None,
+                'rows': rows_copied,
+                'done': bool(done)
+            })
+        
+        # Solo se reanuda sobre la misma tabla destino, con el mismo esquema y la misma clave
+        load_table = parts[0]['load_table']
+        if (any(part['fingerprint'] != self.get_schema_fingerprint(table_name, key_columns) for part in parts)
+                or any(part['key_columns'] != key_columns for part in parts)
+                or not self.mariadb_table_exists(load_table)):
+            self.logger.info(f"El avance guardado de '{table_name}' no corresponde al esquema o a la tabla destino actual - se recarga desde cero")
+            return None
+        return parts
+    
+    def save_checkpoint(self, table_name, part):
+        """Registrar el avance confirmado de una parte de la recarga"""
+        last_key_json = json.dumps([self.encode_value(value) for value in part['last_key']]) if part['last_key'] else None
+        conn = self.connect_state_store()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (table_name, part, load_table, fingerprint, key_columns_json, "
+                "range_condition, last_key_json, rows, done, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (table_name, part['part'], part['load_table'], part['fingerprint'], json.dumps(part['key_columns']),
+                 part['condition'] or '', last_key_json, part['rows'], int(part['done']), datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def clear_checkpoints(self, table_name):
+        """Eliminar el avance registrado de una tabla (recarga terminada o descartada)"""
+        conn = self.connect_state_store()
+        try:
+            conn.execute("DELETE FROM checkpoints WHERE table_name = ?", (table_name,))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def key_after_predicate(self, key_columns, values):
+        """Condición WHERE para las filas con clave posterior a los valores dados (orden lexicográfico)"""
+        alternatives = []
+        for i, column in enumerate(key_columns):
+            terms = [f"[{prev}] = {self.sql_literal(value)}" for prev, value in zip(key_columns[:i], values[:i])]
+            terms.append(f"[{column}] > {self.sql_literal(values[i])}")
+            alternatives.append(' AND '.join(terms))
+        return ' OR '.join([f'({alternative})' for alternative in alternatives])
+    
+    def get_watermark_column(self, table_name):
+        """Obtener la columna de marca de agua configurada o una columna rowversion de la tabla"""
+        configured = self.get_table_setting(table_name, 'WATERMARK')
+        for col in self.get_source_columns(table_name):
+            column_name, data_type = col[0], col[1]
+            if configured:
+                if column_name.lower() == configured.lower():
+                    return column_name
+            elif data_type.lower() in ['timestamp', 'rowversion']:
+                return column_name
+        
+        if configured:
+            self.logger.warning(f"La columna de marca de agua '{configured}' no existe en '{table_name}'")
+        return None
+
+    def get_key_columns(self, table_name):
+        """Obtener las columnas clave de una tabla (configuradas o la clave primaria de SQL Server)"""
+        configured = self.get_table_setting(table_name, 'KEY')
+        if configured:
+            return [col.strip() for col in configured.split(',') if col.strip()]
+        return self.get_source_key_columns(table_name)
+
+    def mariadb_table_exists(self, table_name):
+        """Verificar si la tabla existe en MariaDB"""
+        return self.get_target_columns(table_name) is not None
+
+    def get_incremental_plan(self, table_name):
+        """Preparar la sincronización incremental de una tabla (None si corresponde recarga completa)"""
+        mode = self.get_table_setting(table_name, 'MODE', 'full').lower()
+        if mode != 'incremental':
+            return None
+        
+        watermark_column = self.get_watermark_column(table_name)
+        if not watermark_column:
+            self.logger.warning(f"Tabla '{table_name}' sin columna de marca de agua utilizable - se hará recarga completa")
+            return None
+        
+        key_columns = self.get_key_columns(table_name)
+        if not key_columns:
+            self.logger.warning(f"Tabla '{table_name}' sin clave primaria para upsert - se hará recarga completa")
+            return None
+        
+        # Sin clave primaria en MariaDB el upsert insertaría duplicados
+        problem = self.get_key_problem(table_name, key_columns)
+        if problem:
+            self.logger.warning(f"Tabla '{table_name}': la clave no se puede crear en MariaDB ({problem}) - se hará recarga completa")
+            return None
+        
+        # Capturar la marca de agua ANTES de leer: lo que cambie durante la copia se relee en la próxima ejecución
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MAX([{watermark_column}]) FROM [{table_name}]")
+        new_value = cursor.fetchone()[0]
+        cursor.close()
+        conn.close()
+        
+        predicate = None
+        stored = self.load_watermark(table_name)
+        schema_unchanged = self.load_schema_snapshot(table_name) == self.get_schema_fingerprint(table_name, key_columns)
+        if stored and stored[0] == watermark_column and self.mariadb_table_exists(table_name) and schema_unchanged:
+            predicate = self.watermark_predicate(*stored)
+        elif stored and not schema_unchanged:
+            self.logger.info(f"El esquema de '{table_name}' cambió - recarga completa")
+        else:
+            self.logger.info(f"Tabla '{table_name}' sin marca de agua previa - primera carga completa")
+        
+        return {
+            'column': watermark_column,
+            'key_columns': key_columns,
+            'new_value': new_value,
+            'predicate': predicate
+        }
+
+    def get_change_plan(self, table_name):
+        """Preparar la sincronización por Change Tracking de SQL Server (None si la tabla no usa ese modo)"""
+        mode = self.get_table_setting(table_name, 'MODE', 'full').lower()
+        if mode != 'changes':
+            return None
+        
+        key_columns = self.get_source_key_columns(table_name)
+        if not key_columns:
+            self.logger.warning(f"Tabla '{table_name}' sin clave primaria (Change Tracking la requiere) - se hará recarga completa")
+            return None
+        
+        # Sin clave primaria en MariaDB el upsert insertaría duplicados
+        problem = self.get_key_problem(table_name, key_columns)
+        if problem:
+            self.logger.warning(f"Tabla '{table_name}': la clave no se puede crear en MariaDB ({problem}) - se hará recarga completa")
+            return None
+        
+        # Capturar la versión ANTES de leer: lo que cambie durante la copia se relee en la próxima ejecución
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT CHANGE_TRACKING_CURRENT_VERSION(), CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('{table_name}'))")
+        current_version, min_valid_version = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        
+        if current_version is None or min_valid_version is None:
+            self.logger.warning(f"Change Tracking no está habilitado en '{table_name}' - se hará recarga completa")
+            return None
+        
+        since = None
+        stored = self.load_watermark(table_name)
+        schema_unchanged = self.load_schema_snapshot(table_name) == self.get_schema_fingerprint(table_name, key_columns)
+        stored_version = int(stored[2]) if stored and stored[0] == CHANGE_TRACKING_WATERMARK else None
+        if stored_version is not None and stored_version < min_valid_version:
+            self.logger.warning(f"La versión {stored_version} de '{table_name}' ya no está en la retención de Change Tracking "
+                                f"(mínima válida {min_valid_version}) - recarga completa")
+        elif stored_version is not None and not schema_unchanged:
+            self.logger.info(f"El esquema de '{table_name}' cambió - recarga completa")
+        elif stored_version is not None and self.mariadb_table_exists(table_name):
+            since = stored_version
+        else:
+            self.logger.info(f"Tabla '{table_name}' sin versión de Change Tracking previa - primera carga completa")
+        
+        return {
+            'key_columns': key_columns,
+            'new_value': current_version,
+            'since': since
+        }
+
+    def target_index_name(self, index):
+        """Nombre en MariaDB de un índice de SQL Server"""
+        return self.clean_column_name(index['name'])[:64]
+
+    def drop_secondary_indexes(self, table_name, target_name):
+        """Eliminar los índices secundarios antes de una carga masiva (se recrean al terminar)"""
+        indexes = self.get_source_indexes(table_name)
+        if not indexes:
+            return
+        drops = ', '.join([f"DROP INDEX IF EXISTS `{self.target_index_name(index)}`" for index in indexes])
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE `{target_name}` {drops}")
+        cursor.close()
+        conn.close()
+
+    def create_secondary_indexes(self, table_name, target_name):
+        """Crear en MariaDB los índices secundarios de SQL Server después de la carga masiva"""
+        indexes = self.get_source_indexes(table_name)
+        if not indexes:
+            return
+        
+        # Las columnas TEXT/BLOB solo se pueden indexar por prefijo
+        target_types = {col[0]: col[1].lower() for col in self.get_target_columns(target_name) or []}
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        for index in indexes:
+            columns = []
+            for col in index['columns']:
+                clean = self.clean_column_name(col)
+                prefix = '(255)' if any(kind in target_types.get(clean, '') for kind in ['text', 'blob']) else ''
+                columns.append(f"`{clean}`{prefix}")
+            kind = 'UNIQUE INDEX' if index['unique'] else 'INDEX'
+            name = self.target_index_name(index)
+            problem = self.get_key_problem(table_name, index['columns'], target_types) if index['unique'] else None
+            if problem:
+                # Se conserva como índice común para las consultas, sin la restricción de unicidad
+                self.logger.warning(f"Índice '{name}' creado sin UNIQUE en '{target_name}': {problem}")
+                kind = 'INDEX'
+            try:
+                cursor.execute(f"ALTER TABLE `{target_name}` ADD {kind} `{name}` ({', '.join(columns)})")
+                self.logger.info(f"Índice '{name}' ({', '.join(columns)}) creado en '{target_name}'")
+            except Exception as e:
+                # Un índice que no se puede crear (p. ej. UNIQUE sobre valores truncados) no invalida la carga
+                self.logger.warning(f"No se pudo crear el índice '{name}' en '{target_name}': {str(e)}")
+        cursor.close()
+        conn.close()
+
+    def fetch_in_chunks(self, cursor, chunk_size, metrics=None):
+        """Leer filas de un cursor en bloques de tamaño fijo"""
+        while True:
+            started = time.perf_counter()
+            rows = cursor.fetchmany(chunk_size)
+            if metrics is not None:
+                metrics.add('read', time.perf_counter() - started, len(rows), self.estimate_rows_bytes(rows))
+            if not rows:
+                break
+            yield rows
+
+    def pipeline_chunks(self, cursor, chunk_size, transform, depth, metrics=None):
+        """Leer y transformar bloques en hilos propios, unidos al escritor por colas acotadas"""
+        metrics = metrics or TableMetrics('*')
+        
+        if depth <= 0:
+            for rows in self.fetch_in_chunks(cursor, chunk_size, metrics):
+                with metrics.measure('transform', len(rows)):
+                    data = transform(rows)
+                yield data
+            return
+        
+        # Cada cola guarda como máximo `depth` bloques: la memoria queda acotada aunque una etapa sea más lenta
+        fetched = queue.Queue(maxsize=depth)
+        transformed = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+        
+        def put(stage_queue, item):
+            while not stop.is_set():
+                try:
+                    stage_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def get(stage_queue, producer):
+            # Si la etapa anterior murió sin entregar el fin ni su error (excepción no capturada) no se espera para siempre
+            while not stop.is_set():
+                try:
+                    return stage_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if producer.is_alive():
+                        continue
+                    try:
+                        return stage_queue.get_nowait()
+                    except queue.Empty:
+                        return PipelineError(Exception(f"La etapa '{producer.name}' del pipeline terminó sin completar la lectura"))
+            return None
+        
+        def fetch_stage():
+            try:
+                for rows in self.fetch_in_chunks(cursor, chunk_size, metrics):
+                    if not put(fetched, rows):
+                        return
+                put(fetched, PIPELINE_END)
+            except Exception as e:
+                put(fetched, PipelineError(e))
+        
+        def transform_stage():
+            while True:
+                item = get(fetched, threads[0])
+                if item is None:
+                    return
+                if item is PIPELINE_END or isinstance(item, PipelineError):
+                    put(transformed, item)
+                    return
+                try:
+                    with metrics.measure('transform', len(item)):
+                        data = transform(item)
+                except Exception as e:
+                    put(transformed, PipelineError(e))
+                    return
+                if not put(transformed, data):
+                    return
+        
+        threads = [
+            threading.Thread(target=fetch_stage, name=f'{threading.current_thread().name}-lectura', daemon=True),
+            threading.Thread(target=transform_stage, name=f'{threading.current_thread().name}-transformacion', daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        try:
+            while True:
+                item = get(transformed, threads[1])
+                if item is PIPELINE_END:
+                    break
+                if isinstance(item, PipelineError):
+                    raise item.error
+                yield item
+        finally:
+            # Detener las etapas si el escritor terminó antes (error o cierre del generador)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def build_row_transformer(self, source_columns):
+        """Preparar una sola vez, a partir del esquema, la conversión de filas a tuplas para insertar"""
+        # Los drivers ya devuelven None para NULL, bool para BIT (ambos escritores lo graban como 1/0),
+        # Decimal/datetime/str nativos: solo los tipos que MariaDB no acepta tal cual necesitan conversión
+        converters = []
+        for index, col in enumerate(source_columns):
+            data_type = col[1].lower()
+            if data_type == 'uniqueidentifier':
+                converters.append((index, to_optional_str))
+        
+        if not converters:
+            # Sin conversiones: la transformación se reduce a copiar cada fila a una tupla
+            return lambda rows: list(map(tuple, rows))
+        
+        def transform(rows):
+            # Conversión por columnas: cada convertidor recorre solo su columna
+            columns = list(zip(*rows))
+            for index, convert in converters:
+                columns[index] = tuple(map(convert, columns[index]))
+            return list(zip(*columns))
+        
+        return transform
+
+    def build_insert_query(self, target):
+        """Construir el INSERT (o upsert) para una tabla destino"""
+        columns_str = ', '.join([f'`{col}`' for col in target['columns']])
+        placeholders = ', '.join(['%s'] * len(target['columns']))
+        insert_query = f"INSERT INTO `{target['table']}` ({columns_str}) VALUES ({placeholders})"
+        if target.get('upsert'):
+            updates = ', '.join([f'`{col}` = VALUES(`{col}`)' for col in target['columns']])
+            insert_query += f" ON DUPLICATE KEY UPDATE {updates}"
+        return insert_query
+
+    def rows_to_tsv(self, rows):
+        """Serializar filas al formato de LOAD DATA (tabuladores, \\N para NULL y caracteres escapados)"""
+        escape = lambda match: TSV_ESCAPES[match.group(0)]
+        escape_bytes = lambda match: TSV_BYTES_ESCAPES[match.group(0)]
+        
+        lines = []
+        for row in rows:
+            fields = []
+            for value in row:
+                if value is None:
+                    fields.append(b'\\N')
+                elif isinstance(value, bool):
+                    fields.append(b'1' if value else b'0')
+                elif isinstance(value, (bytes, bytearray)):
+                    fields.append(TSV_BYTES_ESCAPE_RE.sub(escape_bytes, bytes(value)))
+                elif isinstance(value, datetime):
+                    fields.append(value.isoformat(' ').encode('utf-8'))
+                else:
+                    fields.append(TSV_ESCAPE_RE.sub(escape, str(value)).encode('utf-8'))
+            lines.append(b'\t'.join(fields))
+        return b'\n'.join(lines) + b'\n'
+
+    def load_data_chunk(self, cursor, target, data):
+        """Cargar un bloque en MariaDB con LOAD DATA LOCAL INFILE a través de un archivo temporal"""
+        with tempfile.NamedTemporaryFile(prefix='dbsync_', suffix='.tsv', delete=False) as tmp:
+            tmp.write(self.rows_to_tsv(data))
+            path = tmp.name
+        
+        try:
+            columns_str = ', '.join([f'`{col}`' for col in target['columns']])
+            duplicates = 'REPLACE ' if target.get('upsert') else ''
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE '{path.replace(chr(92), '/')}' {duplicates}"
+                f"INTO TABLE `{target['table']}` CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                f"({columns_str})"
+            )
+            loaded = cursor.rowcount
+        finally:
+            os.remove(path)
+        
+        # LOCAL convierte los errores de clave duplicada y de conversión en advertencias y descarta esas filas
+        # en silencio (executemany fallaría): cualquier advertencia o fila faltante hace fallar el bloque
+        cursor.execute("SHOW WARNINGS LIMIT 5")
+        warnings = [row for row in cursor.fetchall() if str(row[0]).lower() != 'note']
+        if warnings or (not target.get('upsert') and loaded != len(data)):
+            details = '; '.join([f"{row[1]}: {row[2]}" for row in warnings])
+            raise Exception(f"LOAD DATA en '{target['table']}' cargó {loaded} de {len(data)} registros"
+                            + (f" con advertencias ({details})" if details else ""))
+
+    def is_lob_column(self, col):
+        """Columna de objeto grande: text, ntext, image, xml o (n)varchar/varbinary(max)"""
+        data_type = col[1].lower()
+        return data_type in ['text', 'ntext', 'image', 'xml'] or (data_type in ['varchar', 'nvarchar', 'varbinary'] and col[2] == -1)
+    
+    def lob_cast_type(self, col):
+        """Tipo (max) de T-SQL al que se convierte una columna de objeto grande para leerla por partes"""
+        data_type = col[1].lower()
+        if data_type in ['image', 'varbinary']:
+            return 'VARBINARY(MAX)'
+        if data_type in ['ntext', 'nvarchar', 'xml']:
+            return 'NVARCHAR(MAX)'
+        return 'VARCHAR(MAX)'
+    
+    def get_lob_plan(self, table_name, key_columns, inline_only=False):
+        """Columnas de objetos grandes de la tabla y umbral a partir del cual se copian en una segunda pasada por clave"""
+        columns = [col for col in self.get_source_columns(table_name) if self.is_lob_column(col)]
+        if not columns:
+            return None
+        
+        inline_bytes = int(self.get_table_setting(table_name, 'LOB_INLINE_BYTES', 65536))
+        if not key_columns:
+            self.logger.warning(f"Tabla '{table_name}' sin clave: sus objetos grandes se copian completos en línea")
+            inline_bytes = 0
+        elif inline_only:
+            inline_bytes = 0
+        
+        # Bloques de lectura acotados por SYNC_LOB_CHUNK_BYTES suponiendo cada objeto en línea en su tamaño máximo
+        chunk_bytes = int(self.get_table_setting(table_name, 'LOB_CHUNK_BYTES', 64 * 1024 * 1024))
+        row_bytes = (inline_bytes or int(self.get_table_setting(table_name, 'LOB_INLINE_BYTES', 65536))) * len(columns)
+        clean_columns = [self.clean_column_name(col[0]) for col in self.get_source_columns(table_name)]
+        return {
+            'columns': columns,
+            'key_columns': key_columns,
+            'inline_bytes': inline_bytes,
+            'indexes': [clean_columns.index(self.clean_column_name(col[0])) for col in columns],
+            'chunk_size': max(1, min(self.chunk_size, chunk_bytes // max(1, row_bytes)))
+        }
+    
+    def lob_length_expression(self, col):
+        """Bytes del valor tal como se copia (en xml DATALENGTH de la columna mide el formato binario interno)"""
+        return f"DATALENGTH(CAST([{col[0]}] AS {self.lob_cast_type(col)}))"
+    
+    def source_select_expression(self, col, lob_plan=None):
+        """Expresión del SELECT de origen para una columna (los objetos grandes que superan el umbral llegan vacíos)"""
+        clean = self.clean_column_name(col[0])
+        if not lob_plan or not lob_plan['inline_bytes'] or not self.is_lob_column(col):
+            return f'[{col[0]}] AS [{clean}]'
+        
+        cast_type = self.lob_cast_type(col)
+        empty = '0x' if cast_type == 'VARBINARY(MAX)' else "''"
+        return (f"CASE WHEN [{col[0]}] IS NULL OR {self.lob_length_expression(col)} <= {lob_plan['inline_bytes']} "
+                f"THEN CAST([{col[0]}] AS {cast_type}) ELSE {empty} END AS [{clean}]")
+    
+    def patch_large_values(self, table_name, target, conditions=None):
+        """Segunda pasada por clave: copiar por partes los objetos grandes que superaron el umbral en línea"""
+        plan = target.get('lob')
+        if not plan or not plan['inline_bytes']:
+            return 0
+        
+        key_columns = plan['key_columns']
+        threshold = plan['inline_bytes']
+        max_allowed_packet = self.max_allowed_packet or DEFAULT_MAX_ALLOWED_PACKET
+        piece_bytes = max(MIN_BATCH_BYTES, min(int(self.get_table_setting(table_name, 'LOB_PIECE_BYTES', 1024 * 1024)),
+                                               max_allowed_packet * 3 // 4))
+        
+        keys_str = ', '.join([self.quote_column(col) for col in key_columns])
+        lengths_str = ', '.join([self.lob_length_expression(col) for col in plan['columns']])
+        oversized = ' OR '.join([f"{self.lob_length_expression(col)} > {threshold}" for col in plan['columns']])
+        query = self.add_where(f"SELECT {keys_str}, {lengths_str} FROM [{table_name}]", list(conditions or []) + [oversized])
+        target_where = ' AND '.join([f"{self.quote_column(col, 'mariadb')} = %s" for col in key_columns])
+        
+        patched = 0
+        patched_bytes = 0
+        started = time.perf_counter()
+        # Una conexión recorre las claves y otra lee las partes (sin MARS no hay dos lecturas abiertas en la misma)
+        keys_conn = self.connect_sqlserver()
+        pieces_conn = self.connect_sqlserver()
+        target_conn = self.connect_mariadb()
+        try:
+            keys_cursor = keys_conn.cursor()
+            keys_cursor.execute(query)
+            pieces_cursor = pieces_conn.cursor()
+            target_cursor = target_conn.cursor()
             
-            # Leer datos de SQL Server
-            sqlserver_conn = self.connect_sqlserver()
+            for chunk in self.fetch_in_chunks(keys_cursor, self.chunk_size):
+                for row in chunk:
+                    key = list(row[:len(key_columns)])
+                    source_where = ' AND '.join([f"{self.quote_column(col)} = {self.sql_literal(value)}"
+                                                 for col, value in zip(key_columns, key)])
+                    for col, length in zip(plan['columns'], row[len(key_columns):]):
+                        if length is None or length <= threshold:
+                            continue
+                        if length > max_allowed_packet:
+                            # MariaDB no puede armar (ni devolver) un valor mayor que max_allowed_packet
+                            self.logger.warning(f"'{table_name}': {col[0]} de la clave {key} ocupa {length} bytes, "
+                                                f"más que max_allowed_packet ({max_allowed_packet}) - queda vacío")
+                            continue
+                        
+                        # Las posiciones de SUBSTRING son unidades UTF-16 en los tipos Unicode y bytes en los demás:
+                        # el recorrido se guía por DATALENGTH del valor convertido, no por el largo de cada parte ya decodificada en Python
+                        # (un carácter fuera del BMP son dos unidades en SQL Server y uno solo en Python)
+                        cast_type = self.lob_cast_type(col)
+                        value = f"CAST([{col[0]}] AS {cast_type})"
+                        if cast_type == 'NVARCHAR(MAX)':
+                            total_units = length // 2
+                            piece_units = max(2, piece_bytes // 2)
+                        else:
+                            total_units = length
+                            piece_units = piece_bytes
+                        target_column = self.quote_column(col[0], 'mariadb')
+                        offset = 1
+                        copied = 0
+                        copied_units = 0
+                        shortened = False
+                        while offset <= total_units:
+                            units = str(piece_units)
+                            if cast_type == 'NVARCHAR(MAX)':
+                                # No cortar un par sustituto: si la parte termina en uno alto se lee una unidad menos
+                                units = (f"{piece_units} - CASE WHEN UNICODE(SUBSTRING({value}, {offset + piece_units - 1}, 1)) "
+                                         f"BETWEEN 55296 AND 56319 THEN 1 ELSE 0 END")
+                            pieces_cursor.execute(f"SELECT SUBSTRING({value}, {offset}, {units}), {units} "
+                                                  f"FROM [{table_name}] WHERE {source_where}")
+                            result = pieces_cursor.fetchone()
+                            piece = result[0] if result else None
+                            if not piece:
+                                # El valor se acortó en el origen después de leer su largo
+                                shortened = True
+                                break
+                            if offset == 1:
+                                assignment = f"{target_column} = %s"
+                            else:
+                                assignment = f"{target_column} = CONCAT({target_column}, %s)"
+                            target_cursor.execute(f"UPDATE `{target['table']}` SET {assignment} WHERE {target_where}",
+                                                  [piece] + key)
+                            patched_bytes += len(piece)
+                            copied += len(piece)
+                            copied_units += len(piece.encode('utf-16-le')) // 2 if cast_type == 'NVARCHAR(MAX)' else len(piece)
+                            offset += result[1]
+                        
+                        # El valor armado en MariaDB debe tener el largo de lo leído, y lo leído el de todo el origen
+                        length_function = 'LENGTH' if cast_type == 'VARBINARY(MAX)' else 'CHAR_LENGTH'
+                        target_cursor.execute(f"SELECT {length_function}({target_column}) FROM `{target['table']}` "
+                                              f"WHERE {target_where}", key)
+                        target_length = (target_cursor.fetchone() or [None])[0]
+                        # (en VARCHAR con intercalación UTF-8 DATALENGTH cuenta bytes y SUBSTRING caracteres)
+                        complete = shortened or cast_type == 'VARCHAR(MAX)' or copied_units == total_units
+                        if target_length != copied or not complete:
+                            raise Exception(f"'{table_name}': {col[0]} de la clave {key} quedó incompleto en MariaDB "
+                                            f"({target_length} de {copied} caracteres; {copied_units} de {total_units} "
+                                            f"unidades leídas de SQL Server)")
+                        # Un commit por valor completo
+                        target_conn.commit()
+                        patched += 1
             
-            # Obtener nombres de columnas originales y limpios
-            cursor = sqlserver_conn.cursor()
-            cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{table_name}' ORDER BY ORDINAL_POSITION")
-            original_columns = [row[0] for row in cursor.fetchall()]
-            clean_columns = [self.clean_column_name(col) for col in original_columns]
-            cursor.close()
+            keys_cursor.close()
+            pieces_cursor.close()
+            target_cursor.close()
+        finally:
+            keys_conn.close()
+            pieces_conn.close()
+            target_conn.close()
+        
+        self.current_metrics().add('lob', time.perf_counter() - started, patched, patched_bytes)
+        if patched:
+            self.logger.info(f"'{table_name}': {patched} objetos grandes copiados por partes ({patched_bytes} bytes)")
+        return patched
+
+    def copy_table_data(self, table_name, select_query, target, expected_rows=None, label=None, checkpoint=None):
+        """Copiar datos de SQL Server a MariaDB en bloques sin cargar la tabla completa en memoria"""
+        label = label or table_name
+        metrics = self.get_table_metrics(table_name)
+        self.thread_state.metrics = metrics
+        
+        # Con diario de avance, cada commit en MariaDB registra la última clave confirmada
+        on_commit = None
+        if checkpoint:
+            key_indexes = [target['columns'].index(self.clean_column_name(col)) for col in checkpoint['key_columns']]
             
-            # Construir query SELECT con nombres originales y alias limpios
-            select_parts = []
-            for orig, clean in zip(original_columns, clean_columns):
-                select_parts.append(f'[{orig}] AS [{clean}]')
-            columns_str = ', '.join(select_parts)
-            query = f"SELECT {columns_str} FROM [{table_name}]"
+            def on_commit(last_row, rows):
+                checkpoint['last_key'] = [last_row[i] for i in key_indexes]
+                checkpoint['rows'] += rows
+                self.save_checkpoint(table_name, checkpoint)
+        
+        sqlserver_conn = self.connect_sqlserver()
+        writer = None
+        try:
+            # Cursor de solo avance: las filas se traen del servidor a medida que se piden
+            source_cursor = sqlserver_conn.cursor()
+            source_cursor.execute(select_query)
             
-            self.logger.info(f"Query SELECT: {query}")
+            writer = BatchWriter(self, table_name, target, metrics, on_commit)
+            snapshot_part = target['snapshot'].open_part() if target.get('snapshot') else None
             
-            # Leer datos usando pandas
-            df = pd.read_sql(query, sqlserver_conn)
+            # Con objetos grandes en línea los bloques se achican para acotar la memoria
+            chunk_size = (target.get('lob') or {}).get('chunk_size') or self.chunk_size
+            self.logger.info(f"'{label}': leyendo registros de SQL Server en bloques de {chunk_size} "
+                             f"(escritor: {writer.mode}, lotes de ~{writer.batch_bytes} bytes)")
+            
+            transform = self.build_row_transformer(self.get_source_columns(table_name))
+            depth = int(self.get_table_setting(table_name, 'PIPELINE_DEPTH', 2))
+            
+            # Lectura, transformación y escritura en paralelo: SQL Server lee mientras MariaDB escribe
+            total_rows = 0
+            chunks = self.pipeline_chunks(source_cursor, chunk_size, transform, depth, metrics)
+            try:
+                for data in chunks:
+                    if snapshot_part:
+                        with metrics.measure('snapshot', len(data)):
+                            snapshot_part.write(data)
+                    writer.write(data)
+                    
+                    total_rows += len(data)
+                    self.logger.info(f"'{label}': insertados {total_rows}/{expected_rows or '?'} registros")
+            finally:
+                chunks.close()
+                if snapshot_part:
+                    snapshot_part.close()
+            
+            writer.finish()
+            source_cursor.close()
+            return total_rows
+            
+        finally:
             sqlserver_conn.close()
+            if writer is not None:
+                writer.close()
+
+    def add_where(self, query, conditions):
+        """Agregar condiciones WHERE (unidas con AND) a una consulta"""
+        conditions = [condition for condition in conditions if condition]
+        if not conditions:
+            return query
+        return f"{query} WHERE " + ' AND '.join([f'({condition})' for condition in conditions])
+
+    def sql_literal(self, value, dialect='sqlserver'):
+        """Convertir un valor de Python a literal de T-SQL o de MariaDB"""
+        if value is None:
+            return 'NULL'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, (int, float, Decimal)):
+            return str(value)
+        if isinstance(value, (bytes, bytearray)):
+            return '0x' + bytes(value).hex()
+        if dialect == 'mariadb':
+            if isinstance(value, datetime):
+                return f"'{value.isoformat(' ')}'"
+            if isinstance(value, date):
+                return f"'{value.isoformat()}'"
+            return "'" + str(value).replace('\\', '\\\\').replace("'", "''") + "'"
+        if isinstance(value, date):
+            return f"CONVERT(DATETIME2, '{value.isoformat()}', 126)"
+        return "N'" + str(value).replace("'", "''") + "'"
+
+    def quote_column(self, column, dialect='sqlserver'):
+        """Citar una columna de origen con la sintaxis de cada servidor (en MariaDB con su nombre limpio)"""
+        if dialect == 'mariadb':
+            return f"`{self.clean_column_name(column)}`"
+        return f"[{column}]"
+
+    def get_range_cuts(self, table_name, column, partitions, conditions=None):
+        """Calcular los valores de corte que dividen una columna en rangos de tamaño similar"""
+        data_types = {col[0].lower(): col[1].lower() for col in self.get_source_columns(table_name)}
+        if column.lower() not in data_types:
+            raise Exception(f"La columna de partición '{column}' no existe en '{table_name}'")
+        
+        data_type = data_types[column.lower()]
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        where = self.add_where('', list(conditions or []) + [f"[{column}] IS NOT NULL"])
+        
+        if data_type in ['int', 'bigint', 'smallint', 'tinyint', 'decimal', 'numeric']:
+            # Columnas numéricas: cortes equidistantes entre MIN y MAX (usa el índice, no ordena la tabla)
+            cursor.execute(f"SELECT MIN([{column}]), MAX([{column}]) FROM [{table_name}]{where}")
+            low, high = cursor.fetchone()
+            cuts = []
+            if low is not None and high > low:
+                for i in range(1, partitions):
+                    if data_type.endswith('int'):
+                        cuts.append(low + (high - low) * i // partitions)
+                    else:
+                        cuts.append(low + (high - low) * i / partitions)
+        else:
+            # Fechas y textos: el primer valor de cada NTILE marca el inicio de cada rango
+            cursor.execute(f"""
+                SELECT MIN([{column}]) FROM (
+                    SELECT [{column}], NTILE({partitions}) OVER (ORDER BY [{column}]) AS tile
+                    FROM [{table_name}]{where}
+                ) AS tiles
+                GROUP BY tile
+                ORDER BY tile
+            """)
+            cuts = [row[0] for row in cursor.fetchall()][1:]
+        
+        cursor.close()
+        conn.close()
+        
+        return sorted(set(cuts))
+
+    def range_conditions(self, column, cuts, dialect='sqlserver'):
+        """Condiciones WHERE de los rangos definidos por los cortes (contiguos y disjuntos)"""
+        if not cuts:
+            return ['1 = 1']
+        
+        # El primer rango incluye los NULL y el último no tiene límite superior
+        quoted = self.quote_column(column, dialect)
+        literals = [self.sql_literal(cut, dialect) for cut in cuts]
+        ranges = [f"{quoted} < {literals[0]} OR {quoted} IS NULL"]
+        for lower, upper in zip(literals, literals[1:]):
+            ranges.append(f"{quoted} >= {lower} AND {quoted} < {upper}")
+        ranges.append(f"{quoted} >= {literals[-1]}")
+        return ranges
+
+    def range_index_expression(self, column, cuts, dialect='sqlserver'):
+        """Expresión CASE que devuelve el número de rango de cada fila"""
+        quoted = self.quote_column(column, dialect)
+        whens = [f"WHEN {quoted} IS NULL THEN 0"]
+        for i, cut in enumerate(cuts):
+            whens.append(f"WHEN {quoted} < {self.sql_literal(cut, dialect)} THEN {i}")
+        return f"CASE {' '.join(whens)} ELSE {len(cuts)} END"
+
+    def get_partition_count(self, table_name):
+        """Rangos a copiar en paralelo: fijo, o con SYNC_PARTITIONS=auto según las filas estimadas del catálogo"""
+        setting = str(self.get_table_setting(table_name, 'PARTITIONS', 1)).lower()
+        if setting != 'auto':
+            return int(setting)
+        
+        rows_per_partition = max(1, int(self.get_table_setting(table_name, 'ROWS_PER_PARTITION', 1000000)))
+        max_partitions = max(1, int(self.get_table_setting(table_name, 'MAX_PARTITIONS', 8)))
+        estimate = self.get_estimated_row_count(table_name) or 0
+        partitions = max(1, min(max_partitions, estimate // rows_per_partition))
+        if partitions > 1:
+            self.logger.info(f"'{table_name}': ~{estimate} registros estimados - {partitions} rangos en paralelo")
+        return partitions
+    
+    def get_partition_ranges(self, table_name, conditions=None):
+        """Dividir una tabla en rangos de clave (condiciones WHERE) para copiarlos en paralelo"""
+        partitions = self.get_partition_count(table_name)
+        if partitions <= 1:
+            return [None]
+        
+        column = self.get_table_setting(table_name, 'PARTITION_COLUMN')
+        if not column:
+            key_columns = self.get_key_columns(table_name)
+            column = key_columns[0] if key_columns else None
+        if not column:
+            self.logger.warning(f"Tabla '{table_name}' sin columna para particionar - se copia en un solo flujo")
+            return [None]
+        
+        cuts = self.get_range_cuts(table_name, column, partitions, conditions)
+        if not cuts:
+            return [None]
+        return self.range_conditions(column, cuts)
+
+    def copy_table_ranges(self, table_name, select_query, conditions, target, ranges):
+        """Copiar cada rango de clave con su propio par lector/escritor en paralelo"""
+        self.logger.info(f"Copiando '{table_name}' en {len(ranges)} rangos en paralelo")
+        
+        total_rows = 0
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix=f'{table_name}-rango') as executor:
+            futures = {}
+            for i, range_condition in enumerate(ranges, 1):
+                query = self.add_where(select_query, list(conditions) + [range_condition])
+                label = f"{table_name} rango {i}/{len(ranges)}"
+                futures[executor.submit(self.copy_table_data, table_name, query, target, None, label)] = (label, range_condition)
             
-            total_rows = len(df)
-            self.logger.info(f"Leyendo {total_rows} registros de SQL Server")
+            for future in as_completed(futures):
+                label, range_condition = futures[future]
+                rows = future.result()
+                total_rows += rows
+                self.logger.info(f"'{label}' ({range_condition}): {rows} registros")
+        
+        return total_rows
+
+    def copy_table_checkpointed(self, table_name, select_query, target, key_columns, parts, expected_rows=None):
+        """Copiar una recarga completa en orden de clave registrando el avance de cada parte para poder reanudarla"""
+        if parts is None:
+            with self.current_metrics().measure('metadata'):
+                ranges = self.get_partition_ranges(table_name, self.get_row_filter(table_name))
+            fingerprint = self.get_schema_fingerprint(table_name, key_columns)
+            parts = []
+            for i, range_condition in enumerate(ranges, 1):
+                part = {
+                    'part': i,
+                    'load_table': target['table'],
+                    'fingerprint': fingerprint,
+                    'key_columns': key_columns,
+                    'condition': range_condition,
+                    'last_key': None,
+                    'rows': 0,
+                    'done': False
+                }
+                self.save_checkpoint(table_name, part)
+                parts.append(part)
+        
+        order_by = ' ORDER BY ' + ', '.join([f'[{col}]' for col in key_columns])
+        
+        def copy_part(part, label, expected=None):
+            conditions = self.get_row_filter(table_name) + [part['condition']]
+            if part['last_key']:
+                conditions.append(self.key_after_predicate(key_columns, part['last_key']))
+            query = self.add_where(select_query, conditions) + order_by
+            rows = self.copy_table_data(table_name, query, target, expected, label, part)
+            part['done'] = True
+            self.save_checkpoint(table_name, part)
+            return rows
+        
+        pending = [part for part in parts if not part['done']]
+        resumed_rows = sum([part['rows'] for part in parts])
+        if resumed_rows:
+            self.logger.info(f"'{table_name}': {resumed_rows} registros ya copiados, se continúa desde la última clave confirmada")
+        
+        if len(parts) == 1:
+            if pending:
+                copy_part(parts[0], table_name, expected_rows)
+            return parts[0]['rows']
+        
+        self.logger.info(f"Copiando '{table_name}' en {len(pending)}/{len(parts)} rangos pendientes en paralelo")
+        with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix=f'{table_name}-rango') as executor:
+            futures = {}
+            for part in pending:
+                label = f"{table_name} rango {part['part']}/{len(parts)}"
+                futures[executor.submit(copy_part, part, label)] = (label, part['condition'])
             
-            # Verificar que los nombres de columnas en el DataFrame coinciden con los nombres limpios
-            df_columns = list(df.columns)
-            self.logger.info("Columnas en DataFrame:")
-            for col in df_columns:
-                self.logger.info(f"  - {col}")
+            for future in as_completed(futures):
+                label, range_condition = futures[future]
+                rows = future.result()
+                self.logger.info(f"'{label}' ({range_condition}): {rows} registros")
+        
+        return sum([part['rows'] for part in parts])
+
+    def create_snapshot(self, table_name, columns, key_columns):
+        """Iniciar el snapshot en disco de la recarga completa de una tabla"""
+        compression = self.get_table_setting(table_name, 'SNAPSHOT_COMPRESSION', 'zstd')
+        # Nunca escribir sobre un snapshot existente: su manifiesto apuntaría a partes mezcladas
+        run_id = self.current_run_id()
+        suffix = 1
+        while os.path.exists(os.path.join(self.snapshot_dir, table_name, run_id)):
+            suffix += 1
+            run_id = f"{self.current_run_id()}_{suffix}"
+        snapshot = TableSnapshot(self.snapshot_dir, table_name, run_id, columns, self.get_source_columns(table_name),
+                                 key_columns or self.get_source_key_columns(table_name),
+                                 self.get_source_indexes(table_name), compression)
+        self.logger.info(f"Guardando snapshot de '{table_name}' en {snapshot.path} ({compression})")
+        return snapshot
+    
+    def find_snapshot(self, table_name, run_id=None):
+        """Manifiesto del último snapshot completo de una tabla (o del de la ejecución indicada)"""
+        table_dir = os.path.join(self.snapshot_dir, table_name)
+        runs = sorted(os.listdir(table_dir), reverse=True) if os.path.isdir(table_dir) else []
+        for run in runs:
+            manifest_file = os.path.join(table_dir, run, 'manifest.json')
+            if (run_id is None or run == run_id) and os.path.exists(manifest_file):
+                with open(manifest_file, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                manifest['path'] = os.path.join(table_dir, run)
+                return manifest
+        return None
+    
+    def prune_snapshots(self, table_name, current_run):
+        """Conservar solo los últimos SYNC_SNAPSHOT_KEEP snapshots completos (contando el recién escrito)"""
+        keep = int(self.get_table_setting(table_name, 'SNAPSHOT_KEEP', 2))
+        table_dir = os.path.join(self.snapshot_dir, table_name)
+        complete = 0
+        for run in sorted(os.listdir(table_dir), reverse=True):
+            run_dir = os.path.join(table_dir, run)
+            if run == current_run:
+                complete += 1
+                continue
+            if os.path.exists(os.path.join(run_dir, 'manifest.json')) and complete < keep:
+                complete += 1
+                continue
+            shutil.rmtree(run_dir, ignore_errors=True)
+            self.logger.info(f"Snapshot '{run_dir}' eliminado")
+    
+    def load_table_from_snapshot(self, table_name, run_id=None):
+        """Recargar una tabla de MariaDB desde su snapshot en disco, sin consultar SQL Server"""
+        metrics = self.get_table_metrics(table_name)
+        self.thread_state.metrics = metrics
+        try:
+            manifest = self.find_snapshot(table_name, run_id)
+            if not manifest:
+                raise Exception(f"No hay un snapshot completo de '{table_name}'" + (f" para la ejecución {run_id}" if run_id else ""))
+            self.logger.info(f"Cargando '{table_name}' desde el snapshot {manifest['path']} ({manifest['rows']} registros)")
             
-            # Verificar que los nombres limpios coinciden con las columnas en MariaDB
-            mariadb_conn = self.connect_mariadb()
-            cursor = mariadb_conn.cursor()
-            cursor.execute(f"DESCRIBE `{table_name}`")
-            mariadb_columns = [col[0] for col in cursor.fetchall()]
-            cursor.close()
-            mariadb_conn.close()
+            # La estructura de origen se toma del manifiesto; de MariaDB solo se consulta la tabla destino
+            with metrics.measure('metadata'):
+                target_columns = self.query_target_columns([table_name]).get(table_name)
+                with self.schema_lock:
+                    self.schema['loaded'].add(table_name.upper())
+                    self.schema['sqlserver'][table_name] = [tuple(col) for col in manifest['source_columns']]
+                    self.schema['keys'][table_name] = manifest['key_columns']
+                    self.schema['indexes'][table_name] = manifest['indexes']
+                    self.schema['mariadb'][table_name] = target_columns
+            
+            key_columns = manifest['key_columns'] or None
+            with metrics.measure('ddl'):
+                load_table = self.prepare_target_table(table_name, key_columns)
+            target = {'table': load_table, 'columns': manifest['columns'], 'upsert': False, 'bulk': True}
+            
+            files = [os.path.join(manifest['path'], part['file']) for part in manifest['parts']]
+            reader = SnapshotReader(files)
+            writer = None
+            total_rows = 0
+            try:
+                writer = BatchWriter(self, table_name, target, metrics)
+                depth = int(self.get_table_setting(table_name, 'PIPELINE_DEPTH', 2))
+                chunks = self.pipeline_chunks(reader, self.chunk_size, lambda rows: rows, depth, metrics)
+                try:
+                    for data in chunks:
+                        writer.write(data)
+                        total_rows += len(data)
+                        self.logger.info(f"'{table_name}': insertados {total_rows}/{manifest['rows']} registros desde el snapshot")
+                finally:
+                    chunks.close()
+                writer.finish()
+            except Exception:
+                if load_table != table_name:
+                    self.drop_shadow_table(load_table)
+                raise
+            finally:
+                reader.close()
+                if writer is not None:
+                    writer.close()
+            
+            with metrics.measure('ddl'):
+                self.create_secondary_indexes(table_name, load_table)
+                if load_table != table_name:
+                    self.swap_shadow_table(table_name, load_table, key_columns)
+            
+            metrics.finish('success', total_rows)
+            self.logger.info(f"✓ Tabla '{table_name}' cargada desde el snapshot {manifest['run_id']}: {total_rows} registros")
+            
+        except Exception as e:
+            metrics.finish('error', error=str(e))
+            self.logger.error(f"✗ Error cargando '{table_name}' desde el snapshot: {str(e)}")
+            raise
+    
+    def load_diff_state(self, table_name):
+        """Leer los cortes y checksums por rango de la última sincronización diferencial"""
+        conn = self.connect_state_store()
+        try:
+            row = conn.execute(
+                "SELECT key_column, cuts_json, checksums_json FROM diff_state WHERE table_name = ?", (table_name,)
+            ).fetchone()
+        finally:
+            conn.close()
+        
+        if not row:
+            return None
+        return {
+            'key_column': row[0],
+            'cuts': [self.decode_value(cut) for cut in json.loads(row[1])],
+            'checksums': {index: (count, checksum) for index, count, checksum in json.loads(row[2])}
+        }
+
+    def save_diff_state(self, table_name, plan):
+        """Guardar los cortes y checksums por rango usados en esta sincronización"""
+        cuts_json = json.dumps([self.encode_value(cut) for cut in plan['cuts']])
+        checksums_json = json.dumps([[index, count, checksum] for index, (count, checksum) in sorted(plan['checksums'].items())])
+        conn = self.connect_state_store()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO diff_state (table_name, key_column, cuts_json, checksums_json, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (table_name, plan['key_column'], cuts_json, checksums_json, datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_source_range_checksums(self, table_name, key_column, cuts):
+        """Contar filas y calcular CHECKSUM_AGG(BINARY_CHECKSUM(...)) de cada rango con una sola consulta"""
+        # BINARY_CHECKSUM no admite columnas de objetos grandes: se comparan las demás
+        lob_types = ['text', 'ntext', 'image', 'xml', 'sql_variant']
+        columns = [f"[{col[0]}]" for col in self.get_source_columns(table_name) if col[1].lower() not in lob_types]
+        
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT range_index, COUNT(*), CHECKSUM_AGG(row_checksum)
+            FROM (
+                SELECT {self.range_index_expression(key_column, cuts)} AS range_index,
+                       BINARY_CHECKSUM({', '.join(columns)}) AS row_checksum
+                FROM [{table_name}]{self.add_where('', self.get_row_filter(table_name))}
+            ) AS ranges
+            GROUP BY range_index
+        """)
+        checksums = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return checksums
+
+    def get_target_range_counts(self, table_name, key_column, cuts):
+        """Contar las filas de cada rango en MariaDB con una sola consulta"""
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {self.range_index_expression(key_column, cuts, 'mariadb')} AS range_index, COUNT(*)
+            FROM `{table_name}`
+            GROUP BY range_index
+        """)
+        counts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return counts
+
+    def get_diff_plan(self, table_name):
+        """Preparar la sincronización diferencial por rangos de clave (None si la tabla no usa ese modo)"""
+        mode = self.get_table_setting(table_name, 'MODE', 'full').lower()
+        if mode != 'diff':
+            return None
+        
+        key_columns = self.get_key_columns(table_name)
+        if not key_columns:
+            self.logger.warning(f"Tabla '{table_name}' sin clave primaria para comparar rangos - se hará recarga completa")
+            return None
+        
+        # Sin clave primaria en MariaDB el upsert insertaría duplicados
+        problem = self.get_key_problem(table_name, key_columns)
+        if problem:
+            self.logger.warning(f"Tabla '{table_name}': la clave no se puede crear en MariaDB ({problem}) - se hará recarga completa")
+            return None
+        
+        # Los rangos se evalúan en cada servidor: solo con claves enteras o fechas ambos ubican cada fila en el mismo
+        # rango (los textos se ordenan con intercalaciones distintas y los decimales y fechas con hora se recortan)
+        key_column = key_columns[0]
+        data_types = {col[0].lower(): col[1].lower() for col in self.get_source_columns(table_name)}
+        if data_types.get(key_column.lower()) not in ['int', 'bigint', 'smallint', 'tinyint', 'date']:
+            self.logger.warning(f"Tabla '{table_name}': la clave '{key_column}' ({data_types.get(key_column.lower())}) "
+                                f"no admite comparar rangos - se hará recarga completa")
+            return None
+        
+        stored = self.load_diff_state(table_name)
+        schema_unchanged = self.load_schema_snapshot(table_name) == self.get_schema_fingerprint(table_name, key_columns)
+        
+        if stored and stored['key_column'] == key_column and schema_unchanged and self.mariadb_table_exists(table_name):
+            # Los cortes se conservan entre ejecuciones para que los checksums sean comparables
+            cuts = stored['cuts']
+        else:
+            stored = None
+            ranges = int(self.get_table_setting(table_name, 'DIFF_RANGES', 32))
+            cuts = self.get_range_cuts(table_name, key_column, ranges, self.get_row_filter(table_name))
+        
+        # Checksums calculados ANTES de copiar: lo que cambie durante la copia se detecta en la próxima ejecución
+        checksums = self.get_source_range_checksums(table_name, key_column, cuts)
+        if stored:
+            tail_cuts = self.get_diff_tail_cuts(table_name, key_column, cuts, checksums)
+            if tail_cuts:
+                # Los rangos nuevos no tienen checksum anterior: se copian en esta ejecución y se guardan los cortes nuevos
+                stored['checksums'].pop(len(cuts), None)
+                cuts = cuts + tail_cuts
+                checksums = self.get_source_range_checksums(table_name, key_column, cuts)
+        
+        return {
+            'key_column': key_column,
+            'key_columns': key_columns,
+            'cuts': cuts,
+            'checksums': checksums,
+            'stored': stored['checksums'] if stored else None
+        }
+    
+    def get_diff_tail_cuts(self, table_name, key_column, cuts, checksums):
+        """Cortes nuevos para el último rango (sin límite superior) cuando supera SYNC_DIFF_TAIL_FACTOR veces el promedio
+        (en tablas que solo agregan filas ese rango acumula todas las inserciones y se recopiaría completo cada vez)"""
+        ranges = int(self.get_table_setting(table_name, 'DIFF_RANGES', 32))
+        factor = float(self.get_table_setting(table_name, 'DIFF_TAIL_FACTOR', 2))
+        tail_rows = checksums.get(len(cuts), (0, None))[0]
+        total_rows = sum([count for count, _ in checksums.values()])
+        average = (total_rows - tail_rows) / len(cuts) if cuts else total_rows / ranges
+        if tail_rows <= factor * max(average, 1):
+            return []
+        
+        pieces = min(ranges, max(2, round(tail_rows / max(average, 1))))
+        conditions = self.get_row_filter(table_name)
+        if cuts:
+            conditions = conditions + [f"{self.quote_column(key_column)} >= {self.sql_literal(cuts[-1])}"]
+        tail_cuts = [cut for cut in self.get_range_cuts(table_name, key_column, pieces, conditions) if not cuts or cut > cuts[-1]]
+        if tail_cuts:
+            self.logger.info(f"'{table_name}': el último rango tiene {tail_rows} filas (promedio {int(average)}), "
+                             f"se divide en {len(tail_cuts) + 1} rangos")
+        return tail_cuts
+
+    def delete_missing_keys(self, table_name, key_columns, source_condition, target_condition):
+        """Eliminar de MariaDB las filas de un rango cuya clave ya no existe en SQL Server"""
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        source_query = f"SELECT {', '.join([self.quote_column(col) for col in key_columns])} FROM [{table_name}]"
+        cursor.execute(self.add_where(source_query, self.get_row_filter(table_name) + [source_condition]))
+        source_keys = set(self.normalize_key(row) for row in cursor.fetchall())
+        cursor.close()
+        conn.close()
+        
+        target_key_columns = [self.quote_column(col, 'mariadb') for col in key_columns]
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(target_key_columns)} FROM `{table_name}` WHERE {target_condition}")
+        missing = [tuple(row) for row in cursor.fetchall() if self.normalize_key(row) not in source_keys]
+        cursor.close()
+        conn.close()
+        
+        self.delete_target_keys(table_name, key_columns, missing)
+        return len(missing)
+
+    def normalize_key(self, row):
+        """Clave comparable entre servidores: textos y uniqueidentifier sin mayúsculas ni espacios finales
+        (intercalaciones de MariaDB) y fechas sin fracción de segundo (DATETIME de MariaDB)"""
+        values = []
+        for value in row:
+            if isinstance(value, (str, uuid.UUID)):
+                value = str(value).upper().rstrip()
+            elif isinstance(value, datetime):
+                value = value.replace(microsecond=0)
+            elif isinstance(value, bytearray):
+                value = bytes(value)
+            values.append(value)
+        return tuple(values)
+    
+    def delete_target_keys(self, table_name, key_columns, keys):
+        """Eliminar de MariaDB las filas con las claves indicadas, en lotes de 1000 con un commit por lote"""
+        if not keys:
+            return
+        
+        target_key_columns = [self.quote_column(col, 'mariadb') for col in key_columns]
+        delete_query = f"DELETE FROM `{table_name}` WHERE " + ' AND '.join([f'{col} = %s' for col in target_key_columns])
+        conn = self.connect_mariadb()
+        cursor = conn.cursor()
+        for i in range(0, len(keys), 1000):
+            cursor.executemany(delete_query, keys[i:i + 1000])
+            conn.commit()
+        cursor.close()
+        conn.close()
+
+    def apply_tracked_changes(self, table_name, select_query, target, plan):
+        """Aplicar en MariaDB las eliminaciones y luego las inserciones/actualizaciones registradas por Change Tracking"""
+        key_columns = plan['key_columns']
+        changes = f"CHANGETABLE(CHANGES [{table_name}], {int(plan['since'])}) AS ct"
+        
+        join = ' AND '.join([f"ct.{self.quote_column(col)} = [{table_name}].{self.quote_column(col)}" for col in key_columns])
+        row_filter = self.get_row_filter(table_name)
+        
+        # Eliminaciones: solo la clave de las filas borradas (o que dejaron de cumplir SYNC_<TABLA>_WHERE),
+        # leídas por bloques y aplicadas en lotes
+        removed = "ct.SYS_CHANGE_OPERATION = 'D'"
+        if row_filter:
+            removed += f" OR NOT EXISTS (SELECT 1 FROM [{table_name}] WHERE {join} AND ({row_filter[0]}))"
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join([f'ct.{self.quote_column(col)}' for col in key_columns])} FROM {changes} "
+                       f"WHERE {removed}")
+        deleted = 0
+        for chunk in self.fetch_in_chunks(cursor, self.chunk_size):
+            keys = [tuple(row) for row in chunk]
+            self.delete_target_keys(table_name, key_columns, keys)
+            deleted += len(keys)
+        cursor.close()
+        conn.close()
+        
+        # Inserciones y actualizaciones: el estado actual de las filas cambiadas, con upsert por clave
+        condition = f"EXISTS (SELECT 1 FROM {changes} WHERE {join} AND ct.SYS_CHANGE_OPERATION <> 'D')"
+        query = self.add_where(select_query, row_filter + [condition])
+        rows = self.copy_table_data(table_name, query, target, None, f"{table_name} cambios")
+        self.patch_large_values(table_name, target, row_filter + [condition])
+        
+        self.logger.info(f"'{table_name}': cambios desde la versión {plan['since']}: {rows} registros aplicados, {deleted} eliminados")
+        return rows
+
+    def reconcile_changed_ranges(self, table_name, select_query, target, plan):
+        """Volver a copiar solo los rangos cuyo checksum o cantidad de filas cambió"""
+        key_column, cuts = plan['key_column'], plan['cuts']
+        source_conditions = self.range_conditions(key_column, cuts)
+        target_conditions = self.range_conditions(key_column, cuts, 'mariadb')
+        target_counts = self.get_target_range_counts(table_name, key_column, cuts)
+        
+        changed = []
+        for index in range(len(source_conditions)):
+            current = plan['checksums'].get(index, (0, None))
+            previous = plan['stored'].get(index, (0, None))
+            if current != previous or current[0] != target_counts.get(index, 0):
+                changed.append(index)
+        
+        self.logger.info(f"'{table_name}': {len(changed)}/{len(source_conditions)} rangos con cambios")
+        
+        total_rows = 0
+        for index in changed:
+            label = f"{table_name} rango {index + 1}/{len(source_conditions)}"
+            # Primero se eliminan las claves que ya no existen; luego se aplican inserciones y actualizaciones
+            deleted = self.delete_missing_keys(table_name, plan['key_columns'], source_conditions[index], target_conditions[index])
+            conditions = self.get_row_filter(table_name) + [source_conditions[index]]
+            rows = self.copy_table_data(table_name, self.add_where(select_query, conditions), target, None, label)
+            self.patch_large_values(table_name, target, conditions)
+            total_rows += rows
+            self.logger.info(f"'{label}' ({source_conditions[index]}): {rows} registros aplicados, {deleted} eliminados")
+        
+        return total_rows
+
+    def sync_table(self, table_name, resume=False):
+        """Sincronizar una tabla específica con mejoras"""
+        metrics = self.get_table_metrics(table_name)
+        self.thread_state.metrics = metrics
+        try:
+            self.logger.info(f"Iniciando sincronización de tabla: {table_name}")
+            
+            # Validar que la tabla existe
+            with metrics.measure('metadata'):
+                table_exists = self.validate_table_exists(table_name)
+            if not table_exists:
+                self.logger.warning(f"⚠️ Tabla '{table_name}' no existe en SQL Server - OMITIDA")
+                metrics.finish('skipped')
+                return
+            
+            # Verificar si tiene datos (con Change Tracking una tabla vaciada aún debe propagar sus eliminaciones)
+            with metrics.measure('metadata'):
+                row_count = self.get_table_row_count(table_name)
+            if row_count == 0 and self.get_table_setting(table_name, 'MODE', 'full').lower() != 'changes':
+                self.logger.info(f"ℹ️ Tabla '{table_name}' está vacía - OMITIDA")
+                metrics.finish('skipped')
+                return
+                
+            self.logger.info(f"📊 Tabla '{table_name}' tiene {row_count} registros")
+            
+            # Mostrar estructura en SQL Server
+            source_columns = self.get_source_columns(table_name)
+            self.logger.info(f"Estructura en SQL Server para '{table_name}':")
+            for col in source_columns:
+                self.logger.info(f"  - {col[0]} ({col[1]}{', ' + str(col[2]) if col[2] else ''})")
+            
+            # Determinar si se puede sincronizar solo el delta (marca de agua, rangos con checksum distinto o Change Tracking)
+            with metrics.measure('metadata'):
+                incremental = self.get_incremental_plan(table_name)
+                diff = self.get_diff_plan(table_name)
+                changes = self.get_change_plan(table_name)
+            key_plan = incremental or diff or changes
+            key_columns = key_plan['key_columns'] if key_plan else None
+            load_table = table_name
+            journal_keys = None
+            checkpoints = None
+            bulk_load = False
+            
+            if incremental and incremental['predicate']:
+                self.logger.info(f"Sincronización incremental de '{table_name}': {incremental['predicate']}")
+            elif diff and diff['stored'] is not None:
+                self.logger.info(f"Sincronización diferencial de '{table_name}' por rangos de '{diff['key_column']}'")
+            elif changes and changes['since'] is not None:
+                self.logger.info(f"Sincronización por Change Tracking de '{table_name}' desde la versión {changes['since']}")
+            else:
+                # Recarga completa: se copia en orden de clave y se registra el avance para poder reanudarla
+                bulk_load = True
+                # Opcional: leer en orden de clave agrega un ordenamiento en montones o claves primarias no agrupadas
+                if self.get_table_setting(table_name, 'CHECKPOINT', 'false').lower() in ['1', 'true', 'yes']:
+                    key_columns = key_columns or self.get_key_columns(table_name) or None
+                    journal_keys = key_columns
+                if resume and journal_keys:
+                    checkpoints = self.load_checkpoints(table_name, journal_keys)
+                
+                if checkpoints:
+                    load_table = checkpoints[0]['load_table']
+                    self.logger.info(f"Reanudando la recarga de '{table_name}' en '{load_table}'")
+                else:
+                    self.clear_checkpoints(table_name)
+                    with metrics.measure('ddl'):
+                        load_table = self.prepare_target_table(table_name, key_columns)
+            
+            # Mostrar estructura en MariaDB
+            target_columns = self.get_target_columns(load_table) or []
+            mariadb_columns = [col[0] for col in target_columns]
+            self.logger.info(f"Estructura en MariaDB para '{table_name}':")
+            for col in target_columns:
+                self.logger.info(f"  - {col[0]} ({col[1]})")
+            
+            # Obtener nombres de columnas originales y limpios
+            original_columns = [col[0] for col in source_columns]
+            clean_columns = [self.clean_column_name(col) for col in original_columns]
+            
+            # Objetos grandes: en línea hasta SYNC_LOB_INLINE_BYTES y el resto por partes en una segunda pasada por clave
+            # (un snapshot necesita los valores completos en el flujo, así que con snapshot van siempre en línea)
+            snapshot_enabled = bulk_load and not checkpoints and \
+                self.get_table_setting(table_name, 'SNAPSHOT', 'false').lower() in ['1', 'true', 'yes']
+            lob_plan = self.get_lob_plan(table_name, key_columns or self.get_key_columns(table_name), snapshot_enabled)
             
-            self.logger.info("Columnas en MariaDB:")
-            for col in mariadb_columns:
-                self.logger.info(f"  - {col}")
+            # Construir query SELECT con nombres originales y alias limpios
+            select_parts = [self.source_select_expression(col, lob_plan) for col in source_columns]
+            columns_str = ', '.join(select_parts)
+            query = f"SELECT {columns_str} FROM [{table_name}]"
+            conditions = self.get_row_filter(table_name)
+            if incremental and incremental['predicate']:
+                conditions.append(incremental['predicate'])
+            
+            self.logger.info(f"Query SELECT: {self.add_where(query, conditions)}")
             
             # Verificar que todas las columnas limpias existen en MariaDB
             missing_columns = [col for col in clean_columns if col not in mariadb_columns]
@@ -590,81 +2933,393 @@ class DatabaseSyncronizer:
             if extra_columns:
                 self.logger.warning(f"Las siguientes columnas existen en MariaDB pero no en SQL Server: {extra_columns}")
             
-            # Insertar datos en MariaDB
-            mariadb_conn = self.connect_mariadb()
-            cursor = mariadb_conn.cursor()
+            # Destino de la escritura con nombres de columnas limpios
+            # (al reanudar se usa upsert: el último lote pudo confirmarse en MariaDB sin llegar al diario;
+            # en una recarga completa la carga es masiva y los índices secundarios se crean después de copiar)
+            target = {'table': load_table, 'columns': clean_columns, 'upsert': bool(key_plan or checkpoints), 'bulk': bulk_load}
+            if lob_plan:
+                target['lob'] = lob_plan
             
-            # Construir query de inserción con nombres de columnas limpios
-            columns_str = ', '.join([f'`{col}`' for col in clean_columns])
-            placeholders = ', '.join(['%s'] * len(clean_columns))
-            insert_query = f"INSERT INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
-            
-            self.logger.info(f"Query de inserción: {insert_query}")
-            
-            # Convertir DataFrame a lista de tuplas, manejando valores especiales
-            data = []
-            for row in df.values:
-                clean_row = []
-                for value in row:
-                    if pd.isna(value) or value is None or str(value).lower() == 'nan':
-                        clean_row.append(None)
-                    elif isinstance(value, bool) or str(value).lower() == 'true':
-                        clean_row.append(1)
-                    elif str(value).lower() == 'false':
-                        clean_row.append(0)
+            # Snapshot en disco de la recarga completa (no de deltas ni de cargas reanudadas, que serían parciales)
+            snapshot = None
+            if snapshot_enabled:
+                snapshot = self.create_snapshot(table_name, clean_columns, key_columns)
+                target['snapshot'] = snapshot
+            
+            self.logger.info(f"Query de inserción: {self.build_insert_query(target)}")
+            
+            # Copiar datos en bloques: cada bloque se escribe en MariaDB antes de leer el siguiente
+            try:
+                if journal_keys:
+                    expected_rows = None if conditions else row_count
+                    total_rows = self.copy_table_checkpointed(table_name, query, target, journal_keys, checkpoints, expected_rows)
+                    self.patch_large_values(table_name, target, conditions)
+                elif diff and diff['stored'] is not None:
+                    total_rows = self.reconcile_changed_ranges(table_name, query, target, diff)
+                elif changes and changes['since'] is not None:
+                    total_rows = self.apply_tracked_changes(table_name, query, target, changes)
+                else:
+                    with metrics.measure('metadata'):
+                        ranges = self.get_partition_ranges(table_name, conditions)
+                    if len(ranges) > 1:
+                        total_rows = self.copy_table_ranges(table_name, query, conditions, target, ranges)
                     else:
-                        clean_row.append(value)
-                data.append(tuple(clean_row))
+                        expected_rows = None if conditions else row_count
+                        total_rows = self.copy_table_data(table_name, self.add_where(query, conditions), target, expected_rows)
+                    self.patch_large_values(table_name, target, conditions)
+            except Exception:
+                # Con diario de avance la tabla sombra se conserva para reanudar con sync --resume
+                if load_table != table_name and not journal_keys:
+                    self.drop_shadow_table(load_table)
+                if snapshot:
+                    shutil.rmtree(snapshot.path, ignore_errors=True)
+                raise
             
-            # Insertar en lotes de 1000
-            batch_size = 1000
-            for i in range(0, len(data), batch_size):
-                batch = data[i:i + batch_size]
-                cursor.executemany(insert_query, batch)
-                mariadb_conn.commit()
-                self.logger.info(f"Insertados {min(i + batch_size, total_rows)}/{total_rows} registros")
+            if bulk_load:
+                with metrics.measure('ddl'):
+                    self.create_secondary_indexes(table_name, load_table)
             
-            cursor.close()
-            mariadb_conn.close()
+            if load_table != table_name:
+                with metrics.measure('ddl'):
+                    self.swap_shadow_table(table_name, load_table, key_columns)
             
+            # Guardar la marca de agua solo después de una copia exitosa
+            if incremental and incremental['new_value'] is not None:
+                self.save_watermark(table_name, incremental['column'], incremental['new_value'])
+            if diff:
+                self.save_diff_state(table_name, diff)
+            if changes:
+                self.save_watermark(table_name, CHANGE_TRACKING_WATERMARK, changes['new_value'])
+            if journal_keys:
+                self.clear_checkpoints(table_name)
+            if snapshot:
+                snapshot.finish(total_rows)
+                self.prune_snapshots(table_name, snapshot.run_id)
+            
+            metrics.finish('success', total_rows)
             self.logger.info(f"✓ Sincronización de tabla '{table_name}' completada: {total_rows} registros")
             
         except Exception as e:
+            metrics.finish('error', error=str(e))
             self.logger.error(f"✗ Error sincronizando tabla '{table_name}': {str(e)}")
             self.logger.error(f"Traceback:\n{traceback.format_exc()}")
             self.logger.error(f"Fallo en tabla '{table_name}': {str(e)}")
             raise
     
-    def sync_all_tables(self):
-        """Sincronizar todas las tablas configuradas"""
+    def sync_all_tables(self, resume=False):
+        """Sincronizar todas las tablas configuradas (con resume se continúan las recargas interrumpidas)"""
         start_time = datetime.now()
-        self.logger.info("=== INICIANDO SINCRONIZACIÓN COMPLETA ===")
+        self.logger.info("=== INICIANDO SINCRONIZACIÓN COMPLETA ===" + (" (reanudando recargas interrumpidas)" if resume else ""))
+        self.reset_run_metrics()
         
         success_count = 0
         error_count = 0
         
-        for table_name in self.tables_to_sync:
-            table_name = table_name.strip()
-            if not table_name:
-                continue
-                
-            try:
-                self.sync_table(table_name)
-                success_count += 1
-            except Exception as e:
-                error_count += 1
-                self.logger.error(f"Fallo en tabla '{table_name}': {str(e)}")
+        tables = [table_name.strip() for table_name in self.tables_to_sync if table_name.strip()]
+        
+        # Metadata, existencia y filas estimadas de todas las tablas en una consulta por servidor (se recarga en cada ejecución)
+        self.reset_schema_metadata()
+        try:
+            with self.run_phases.measure('metadata'):
+                self.load_schema_metadata(tables)
+        except Exception as e:
+            self.logger.warning(f"No se pudo cargar la metadata en bloque, se consultará por tabla: {str(e)}")
+        
+        if self.workers > 1 and len(tables) > 1:
+            # Cada tabla se sincroniza en su propio hilo con sus propias conexiones; las más grandes primero,
+            # para que no sean la última en terminar mientras los demás hilos esperan
+            tables.sort(key=lambda table_name: self.schema['rows'].get(table_name) or 0, reverse=True)
+            workers = min(self.workers, len(tables))
+            self.logger.info(f"Sincronizando {len(tables)} tablas en paralelo con {workers} workers")
+            
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync') as executor:
+                futures = {executor.submit(self.sync_table, table_name, resume): table_name for table_name in tables}
+                for future in as_completed(futures):
+                    table_name = futures[future]
+                    try:
+                        future.result()
+                        success_count += 1
+                    except Exception as e:
+                        error_count += 1
+                        self.logger.error(f"Fallo en tabla '{table_name}': {str(e)}")
+        else:
+            for table_name in tables:
+                try:
+                    self.sync_table(table_name, resume)
+                    success_count += 1
+                except Exception as e:
+                    error_count += 1
+                    self.logger.error(f"Fallo en tabla '{table_name}': {str(e)}")
         
         end_time = datetime.now()
         duration = end_time - start_time
         
+        # Reporte con tiempos por tabla y por fase
+        report = self.build_run_report(start_time, end_time, success_count, error_count)
+        self.close_connections()
+        self.write_run_report(report)
+        self.last_report = report
+        
         self.logger.info("=== SINCRONIZACIÓN COMPLETADA ===")
+        for table_report in report['tables']:
+            phases = ', '.join([f"{phase} {totals['seconds']}s" for phase, totals in table_report['phases'].items()])
+            self.logger.info(f"  {table_report['table']}: {table_report['status']}, {table_report['rows']} registros "
+                             f"en {table_report['seconds']}s ({phases})")
         self.logger.info(f"Tablas exitosas: {success_count}")
         self.logger.info(f"Tablas con errores: {error_count}")
         self.logger.info(f"Duración total: {duration}")
         
         return error_count == 0
     
+    def load_all_from_snapshots(self, tables=None, run_id=None):
+        """Recargar MariaDB desde los snapshots en disco de las tablas indicadas (o de todas las configuradas)"""
+        start_time = datetime.now()
+        self.logger.info("=== CARGANDO DESDE SNAPSHOTS ===")
+        self.reset_run_metrics()
+        self.reset_schema_metadata()
+        
+        success_count = 0
+        error_count = 0
+        tables = tables or [table_name.strip() for table_name in self.tables_to_sync if table_name.strip()]
+        for table_name in tables:
+            try:
+                self.load_table_from_snapshot(table_name, run_id)
+                success_count += 1
+            except Exception:
+                error_count += 1
+        
+        report = self.build_run_report(start_time, datetime.now(), success_count, error_count)
+        self.close_connections()
+        self.write_run_report(report, 'snapshot_report')
+        
+        self.logger.info(f"Tablas cargadas: {success_count}, con errores: {error_count}")
+        return error_count == 0
+    
+    def build_verify_hasher(self, target_columns):
+        """Hash de 64 bits de una fila normalizada según el tipo de cada columna en MariaDB
+        (así la fila leída de SQL Server y la guardada en MariaDB producen el mismo valor)"""
+        normalizers = []
+        for _, column_type in target_columns:
+            column_type = column_type.decode() if isinstance(column_type, (bytes, bytearray)) else str(column_type)
+            column_type = column_type.lower()
+            match = re.match(r'(\w+)(?:\((\d+)(?:,(\d+))?\))?', column_type)
+            base, length, scale = match.group(1), match.group(2), match.group(3)
+            
+            if base in ['decimal', 'numeric']:
+                quantum = Decimal(1).scaleb(-int(scale or 0))
+                normalizers.append(lambda v, q=quantum: str(Decimal(str(v)).quantize(q, rounding=ROUND_HALF_UP)))
+            elif base in ['float', 'double', 'real']:
+                digits = '.6g' if base == 'float' else '.15g'
+                normalizers.append(lambda v, d=digits: format(float(v), d))
+            elif base in ['tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'boolean', 'bool']:
+                normalizers.append(lambda v: str(int(v)))
+            elif base in ['datetime', 'timestamp']:
+                # DATETIME sin fracción trunca los microsegundos
+                keep_micro = '.' in column_type or (length is not None and int(length) > 0)
+                normalizers.append(lambda v, m=keep_micro: (v if isinstance(v, datetime) else datetime(v.year, v.month, v.day))
+                                   .replace(microsecond=v.microsecond if m and isinstance(v, datetime) else 0).isoformat(' '))
+            elif base == 'date':
+                normalizers.append(lambda v: (v.date() if isinstance(v, datetime) else v).isoformat())
+            elif base in ['binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob']:
+                normalizers.append(lambda v: bytes(v).hex() if isinstance(v, (bytes, bytearray)) else str(v).encode('utf-8').hex())
+            elif base in ['char', 'varchar'] and length:
+                normalizers.append(lambda v, n=int(length): str(v)[:n])
+            else:
+                normalizers.append(lambda v: v.decode('utf-8', 'replace') if isinstance(v, (bytes, bytearray)) else str(v))
+        
+        def row_hash(row):
+            values = ['\x00' if value is None else normalize(value) for normalize, value in zip(normalizers, row)]
+            digest = hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=8).digest()
+            return int.from_bytes(digest, 'big')
+        
+        return row_hash
+    
+    def hash_query_rows(self, connect, query, row_hash):
+        """Cantidad de filas y suma de sus hashes (módulo 2^64, independiente del orden en que lleguen)"""
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            count, total = 0, 0
+            for chunk in self.fetch_in_chunks(cursor, self.chunk_size):
+                count += len(chunk)
+                total = (total + sum(map(row_hash, chunk))) & 0xFFFFFFFFFFFFFFFF
+            cursor.close()
+            return count, total
+        finally:
+            conn.close()
+    
+    def count_query_rows(self, connect, query):
+        """Ejecutar un SELECT COUNT(*) en el servidor indicado"""
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            count = cursor.fetchone()[0]
+            cursor.close()
+            return count
+        finally:
+            conn.close()
+    
+    def get_verify_range_counts(self, table_name, key_column, cuts):
+        """Filas por rango de clave en SQL Server y en MariaDB (una consulta agrupada por servidor)"""
+        conn = self.connect_sqlserver()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT range_index, COUNT(*)
+            FROM (
+                SELECT {self.range_index_expression(key_column, cuts)} AS range_index
+                FROM [{table_name}]{self.add_where('', self.get_row_filter(table_name))}
+            ) AS ranges
+            GROUP BY range_index
+        """)
+        source_counts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return source_counts, self.get_target_range_counts(table_name, key_column, cuts)
+    
+    def verify_table(self, table_name, mode=None):
+        """Comparar una tabla de SQL Server con MariaDB: filas por rango de clave y hash de las filas de cada rango"""
+        started = time.perf_counter()
+        mode = (mode or self.get_table_setting(table_name, 'VERIFY_MODE', 'sample')).lower()
+        result = {'table': table_name, 'mode': mode, 'status': 'ok', 'mismatches': []}
+        
+        source_columns = self.get_source_columns(table_name)
+        target_columns = self.get_target_columns(table_name)
+        if not source_columns:
+            result['status'] = 'skipped'
+            self.logger.warning(f"⚠️ Tabla '{table_name}' no existe en SQL Server - OMITIDA")
+            return result
+        if target_columns is None:
+            result['status'] = 'mismatch'
+            result['mismatches'].append({'range': None, 'reason': 'La tabla no existe en MariaDB'})
+            return result
+        
+        clean_columns = [self.clean_column_name(col[0]) for col in source_columns]
+        types = {name: column_type for name, column_type in target_columns}
+        missing = [col for col in clean_columns if col not in types]
+        if missing:
+            result['status'] = 'mismatch'
+            result['mismatches'].append({'range': None, 'reason': f"Columnas que no existen en MariaDB: {missing}"})
+            return result
+        row_hash = self.build_verify_hasher([(col, types[col]) for col in clean_columns])
+        
+        # Rangos de la primera columna de la clave; las claves de texto se comparan como un solo rango
+        # porque cada servidor las ordena con su propia intercalación
+        key_columns = self.get_key_columns(table_name)
+        key_column = key_columns[0] if key_columns else None
+        data_types = {col[0].lower(): col[1].lower() for col in source_columns}
+        cuts = []
+        if key_column and data_types.get(key_column.lower()) not in ['char', 'varchar', 'nchar', 'nvarchar', 'uniqueidentifier']:
+            ranges = int(self.get_table_setting(table_name, 'VERIFY_RANGES', 32))
+            cuts = self.get_range_cuts(table_name, key_column, ranges, self.get_row_filter(table_name))
+        
+        if cuts:
+            source_conditions = self.range_conditions(key_column, cuts)
+            target_conditions = self.range_conditions(key_column, cuts, 'mariadb')
+            source_counts, target_counts = self.get_verify_range_counts(table_name, key_column, cuts)
+        else:
+            source_conditions, target_conditions = [None], [None]
+            source_counts = {0: self.count_query_rows(self.connect_sqlserver, self.add_where(
+                f"SELECT COUNT(*) FROM [{table_name}]", self.get_row_filter(table_name)))}
+            target_counts = {0: self.count_query_rows(self.connect_mariadb, f"SELECT COUNT(*) FROM `{table_name}`")}
+        
+        result['key_column'] = key_column
+        result['source_rows'] = sum(source_counts.values())
+        result['target_rows'] = sum(target_counts.values())
+        result['ranges_total'] = len(source_conditions)
+        
+        # Los rangos con distinta cantidad de filas ya son discrepancias; del resto se comparan los hashes
+        # de todos (full) o de una muestra aleatoria (sample, SYNC_VERIFY_SAMPLE de los rangos)
+        candidates = []
+        for index, condition in enumerate(source_conditions):
+            source_rows, target_rows = source_counts.get(index, 0), target_counts.get(index, 0)
+            if source_rows != target_rows:
+                result['mismatches'].append({'range': condition, 'source_rows': source_rows, 'target_rows': target_rows,
+                                             'reason': 'Cantidad de filas distinta'})
+            elif source_rows:
+                candidates.append(index)
+        if mode != 'full' and not cuts:
+            # Un solo rango (clave de texto o sin clave): hashearlo sería leer la tabla completa en ambos servidores
+            if candidates:
+                self.logger.info(f"'{table_name}': sin rangos de clave, en modo muestra solo se comparan las filas "
+                                 f"(el hash requiere --full)")
+            candidates = []
+        elif mode != 'full':
+            fraction = float(self.get_table_setting(table_name, 'VERIFY_SAMPLE', 0.1))
+            candidates = sorted(random.sample(candidates, min(len(candidates), max(1, int(round(len(candidates) * fraction))))))
+        result['ranges_hashed'] = len(candidates)
+        
+        source_query = f"SELECT {', '.join([f'[{col[0]}]' for col in source_columns])} FROM [{table_name}]"
+        target_query = f"SELECT {', '.join([f'`{col}`' for col in clean_columns])} FROM `{table_name}`"
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{table_name}-verif') as sides:
+            for index in candidates:
+                # SQL Server y MariaDB se leen a la vez
+                source_future = sides.submit(self.hash_query_rows, self.connect_sqlserver,
+                                             self.add_where(source_query, self.get_row_filter(table_name) + [source_conditions[index]]),
+                                             row_hash)
+                target_hash = self.hash_query_rows(self.connect_mariadb, self.add_where(target_query, [target_conditions[index]]), row_hash)
+                source_hash = source_future.result()
+                if source_hash != target_hash:
+                    result['mismatches'].append({'range': source_conditions[index], 'source_rows': source_hash[0],
+                                                 'target_rows': target_hash[0], 'reason': 'Checksum distinto'})
+        
+        if result['mismatches']:
+            result['status'] = 'mismatch'
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+    
+    def verify_all_tables(self, tables=None, mode=None):
+        """Verificar en paralelo que MariaDB coincide con SQL Server y guardar el reporte; True si no hay diferencias"""
+        start_time = datetime.now()
+        self.logger.info("=== VERIFICANDO TABLAS ===")
+        self.reset_schema_metadata()
+        
+        tables = tables or [table_name.strip() for table_name in self.tables_to_sync if table_name.strip()]
+        try:
+            self.load_schema_metadata(tables)
+        except Exception as e:
+            self.logger.warning(f"No se pudo cargar la metadata en bloque, se consultará por tabla: {str(e)}")
+        
+        results = []
+        workers = max(1, min(int(os.getenv('SYNC_VERIFY_WORKERS', 4)), len(tables)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify') as executor:
+            futures = {executor.submit(self.verify_table, table_name, mode): table_name for table_name in tables}
+            for future in as_completed(futures):
+                table_name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error verificando tabla '{table_name}': {str(e)}")
+                    result = {'table': table_name, 'status': 'error', 'error': str(e), 'mismatches': []}
+                results.append(result)
+                
+                if result['status'] == 'mismatch':
+                    self.logger.warning(f"✗ '{table_name}': {len(result['mismatches'])} discrepancias")
+                    for mismatch in result['mismatches']:
+                        self.logger.warning(f"    {mismatch['reason']}: {mismatch['range'] or 'tabla completa'} "
+                                            f"(SQL Server {mismatch.get('source_rows', '?')}, MariaDB {mismatch.get('target_rows', '?')})")
+                elif result['status'] == 'ok':
+                    self.logger.info(f"✓ '{table_name}': {result['source_rows']} registros, "
+                                     f"{result['ranges_hashed']}/{result['ranges_total']} rangos comparados ({result['mode']})")
+        
+        end_time = datetime.now()
+        failed = [result for result in results if result['status'] in ['mismatch', 'error']]
+        report = {
+            'started': start_time.isoformat(),
+            'finished': end_time.isoformat(),
+            'seconds': round((end_time - start_time).total_seconds(), 3),
+            'success': not failed,
+            'tables_ok': len([result for result in results if result['status'] == 'ok']),
+            'tables_failed': len(failed),
+            'tables': sorted(results, key=lambda result: result['table'])
+        }
+        self.close_connections()
+        self.write_run_report(report, 'verify_report')
+        
+        self.logger.info(f"=== VERIFICACIÓN COMPLETADA: {report['tables_ok']} tablas coinciden, {len(failed)} con diferencias o errores ===")
+        return not failed
+    
     def cleanup_old_logs(self):
         """Limpiar logs antiguos"""
         try:
@@ -687,42 +3342,215 @@ class DatabaseSyncronizer:
         except Exception as e:
             self.logger.warning(f"Error limpiando logs antiguos: {str(e)}")
     
-    def run_scheduled_sync(self):
-        """Ejecutar sincronización programada"""
-        self.logger.info("Ejecutando sincronización programada...")
+    def parse_interval(self, value):
+        """Convertir un intervalo como 90, 30s, 15m, 2h o 1d a segundos (None = diario a SYNC_TIME)"""
+        value = str(value or '').strip().lower()
+        if not value or value == 'daily':
+            return None
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        if value[-1] in units:
+            return max(1, int(float(value[:-1]) * units[value[-1]]))
+        return max(1, int(float(value)))
+    
+    def next_daily_run(self, now):
+        """Próxima ocurrencia de SYNC_TIME"""
+        hour, minute = [int(part) for part in self.sync_time.split(':')[:2]]
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return next_run
+    
+    def build_table_schedules(self, now):
+        """Intervalo, prioridad y cupos de cada tabla configurada"""
+        entries = []
+        for table_name in [table_name.strip() for table_name in self.tables_to_sync if table_name.strip()]:
+            interval = self.parse_interval(self.get_table_setting(table_name, 'INTERVAL'))
+            entries.append({
+                'table': table_name,
+                'interval': interval,
+                'priority': int(self.get_table_setting(table_name, 'PRIORITY', 0)),
+                'slots': max(1, int(self.get_table_setting(table_name, 'SLOTS', 1))),
+                # Las tablas con intervalo arrancan de inmediato; las diarias esperan a SYNC_TIME
+                'next_run': now if interval else self.next_daily_run(now),
+                'running': False
+            })
+        return entries
+    
+    def probe_table_changes(self, table_name):
+        """Sondeo barato de cambios en el origen: (cambió, firma); cambió es None si no se puede saber"""
+        if self.get_table_setting(table_name, 'PROBE', 'true').lower() not in ['1', 'true', 'yes']:
+            return None, None
+        if not self.mariadb_table_exists(table_name):
+            return True, None
         
-        # Probar conexiones antes de sincronizar
-        if not self.test_connections():
-            self.logger.error("Error en las conexiones. Sincronización cancelada.")
-            return
+        try:
+            conn = self.connect_sqlserver()
+            cursor = conn.cursor()
+            stored = self.load_watermark(table_name)
+            if self.get_table_setting(table_name, 'MODE', 'full').lower() == 'changes' and stored and stored[0] == CHANGE_TRACKING_WATERMARK:
+                # Change Tracking: basta con saber si hay al menos un cambio desde la versión guardada
+                cursor.execute(f"""
+                    SELECT CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('{table_name}')),
+                           (SELECT TOP 1 1 FROM CHANGETABLE(CHANGES [{table_name}], {int(stored[2])}) AS ct)
+                """)
+                min_valid_version, has_changes = cursor.fetchone()
+                changed = min_valid_version is None or min_valid_version > int(stored[2]) or bool(has_changes)
+                signature = None
+            else:
+                # Firma del catálogo: filas de sys.partitions y última escritura registrada por SQL Server
+                cursor.execute(f"""
+                    SELECT (SELECT SUM(p.rows) FROM sys.partitions p
+                            WHERE p.object_id = OBJECT_ID('{table_name}') AND p.index_id IN (0, 1)),
+                           (SELECT MAX(s.last_user_update) FROM sys.dm_db_index_usage_stats s
+                            WHERE s.database_id = DB_ID() AND s.object_id = OBJECT_ID('{table_name}'))
+                """)
+                signature = tuple(cursor.fetchone())
+                previous = self.change_signatures.get(table_name)
+                changed = None if previous is None else previous != signature
+            cursor.close()
+            conn.close()
+            return changed, signature
+        except Exception as e:
+            self.logger.warning(f"No se pudo sondear cambios en '{table_name}', se sincroniza: {str(e)}")
+            return None, None
+    
+    def run_scheduled_table(self, entry):
+        """Sincronizar una tabla programada si el sondeo no descarta cambios"""
+        table_name = entry['table']
+        start_time = datetime.now()
+        with self.metrics_lock:
+            self.run_metrics.pop(table_name, None)
+        # El daemon no reinicia las métricas: cada ejecución programada lleva su propio identificador (snapshots)
+        self.thread_state.run_id = start_time.strftime('%Y%m%d_%H%M%S')
         
-        # Ejecutar sincronización
-        success = self.sync_all_tables()
+        changed, signature = self.probe_table_changes(table_name)
+        if changed is False:
+            self.logger.info(f"'{table_name}' sin cambios en el origen desde la última sincronización - OMITIDA")
+            self.get_table_metrics(table_name).finish('unchanged')
+            return
         
-        # Limpiar logs antiguos
-        self.cleanup_old_logs()
+        success = True
+        try:
+            self.sync_table(table_name)
+            if signature is not None:
+                self.change_signatures[table_name] = signature
+        except Exception:
+            # sync_table ya registró el error; la tabla se reintenta en su próxima ejecución
+            success = False
         
-        if success:
-            self.logger.info("🎉 Sincronización programada completada exitosamente")
-        else:
-            self.logger.error("⚠️ Sincronización completada con errores")
+        metrics = self.get_table_metrics(table_name)
+        report = self.build_run_report(start_time, datetime.now(), int(success), int(not success))
+        report['tables'] = [metrics.to_dict()]
+        self.write_run_report(report)
     
     def start_scheduler(self):
-        """Iniciar el programador de tareas"""
-        self.logger.info(f"Programando sincronización diaria a las {self.sync_time}")
+        """Programador por tabla: cada una con su intervalo, prioridad y cupos, sin ejecuciones solapadas"""
+        if self.metrics_port:
+            self.start_metrics_server()
+        
+        budget = max(1, int(os.getenv('SYNC_SCHEDULER_SLOTS', self.workers)))
+        entries = self.build_table_schedules(datetime.now())
+        if not entries:
+            self.logger.error("No hay tablas configuradas en TABLES_TO_SYNC")
+            return
+        
+        for entry in entries:
+            cadence = f"cada {entry['interval']}s" if entry['interval'] else f"diaria a las {self.sync_time}"
+            self.logger.info(f"Programada '{entry['table']}': {cadence}, prioridad {entry['priority']}, "
+                             f"{min(entry['slots'], budget)} cupo(s); próxima ejecución {entry['next_run']}")
+        self.logger.info(f"Programador iniciado con {budget} cupos. Presiona Ctrl+C para detener.")
         
-        # Programar tarea diaria
-        schedule.every().day.at(self.sync_time).do(self.run_scheduled_sync)
+        lock = threading.Lock()
+        wake = threading.Event()
+        state = {'free': budget}
+        last_cleanup = None
         
-        self.logger.info("Programador iniciado. Presiona Ctrl+C para detener.")
-        self.logger.info(f"Próxima ejecución: {schedule.next_run()}")
+        def on_done(entry, started):
+            # Próxima ejecución contada desde el inicio de esta (o inmediata si ya venció); las diarias a SYNC_TIME
+            now = datetime.now()
+            with lock:
+                entry['running'] = False
+                state['free'] += min(entry['slots'], budget)
+                if entry['interval']:
+                    entry['next_run'] = max(started + timedelta(seconds=entry['interval']), now)
+                else:
+                    entry['next_run'] = self.next_daily_run(now)
+                idle = state['free'] == budget
+            
+            with self.metrics_lock:
+                statuses = [metrics.status for metrics in self.run_metrics.values()]
+            self.last_report = self.build_run_report(started, now, statuses.count('success') + statuses.count('unchanged'),
+                                                     statuses.count('error'))
+            if idle:
+                # Sin tablas en curso no se conservan conexiones (pueden pasar horas hasta la próxima)
+                self.close_connections()
+            wake.set()
         
+        def run(entry, started):
+            try:
+                self.run_scheduled_table(entry)
+            except Exception as e:
+                self.logger.error(f"Fallo en tabla programada '{entry['table']}': {str(e)}")
+            finally:
+                on_done(entry, started)
+        
+        executor = ThreadPoolExecutor(max_workers=budget, thread_name_prefix='sched')
         try:
             while True:
-                schedule.run_pending()
-                time.sleep(60)  # Verificar cada minuto
+                now = datetime.now()
+                with lock:
+                    due = [entry for entry in entries if not entry['running'] and entry['next_run'] <= now]
+                    idle = state['free'] == budget
+                # Mayor prioridad primero y, a igual prioridad, la que lleva más tiempo vencida
+                due.sort(key=lambda entry: (-entry['priority'], entry['next_run']))
+                
+                if due and idle and not self.test_connections():
+                    self.logger.error("Error en las conexiones. Se reintenta en 5 minutos.")
+                    with lock:
+                        for entry in due:
+                            entry['next_run'] = now + timedelta(minutes=5)
+                    due = []
+                
+                launch = []
+                with lock:
+                    for entry in due:
+                        slots = min(entry['slots'], budget)
+                        if slots > state['free']:
+                            # No se adelantan tablas de menor prioridad para no postergar indefinidamente a las grandes
+                            break
+                        state['free'] -= slots
+                        entry['running'] = True
+                        launch.append(entry)
+                
+                if launch:
+                    # Metadata, existencia y filas estimadas de las tablas que arrancan, en una consulta por servidor
+                    names = [entry['table'] for entry in launch]
+                    with self.schema_lock:
+                        for table_name in names:
+                            self.schema['loaded'].discard(table_name.upper())
+                    try:
+                        self.load_schema_metadata(names)
+                    except Exception as e:
+                        self.logger.warning(f"No se pudo cargar la metadata en bloque, se consultará por tabla: {str(e)}")
+                    for entry in launch:
+                        self.logger.info(f"Ejecutando sincronización programada de '{entry['table']}'")
+                        executor.submit(run, entry, datetime.now())
+                
+                if last_cleanup != now.date():
+                    self.cleanup_old_logs()
+                    last_cleanup = now.date()
+                
+                # Dormir hasta la próxima tabla por vencer o hasta que termine una en curso
+                # (las vencidas sin cupos libres esperan a que se libere alguno)
+                now = datetime.now()
+                with lock:
+                    pending = [entry['next_run'] for entry in entries if not entry['running'] and entry['next_run'] > now]
+                wake.wait((min(pending) - now).total_seconds() if pending else None)
+                wake.clear()
         except KeyboardInterrupt:
             self.logger.info("Programador detenido por el usuario")
+        finally:
+            executor.shutdown(wait=False)
 
 def main():
     """Función principal"""
@@ -741,19 +3569,40 @@ def main():
                 sys.exit(1)
                 
         elif command == 'sync':
-            # Ejecutar sincronización manual
-            success = syncronizer.sync_all_tables()
+            # Ejecutar sincronización manual (--resume continúa las recargas interrumpidas)
+            success = syncronizer.sync_all_tables(resume='--resume' in sys.argv[2:])
             sys.exit(0 if success else 1)
             
         elif command == 'schedule':
             # Iniciar programador
             syncronizer.start_scheduler()
             
+        elif command == 'verify':
+            # Comparar SQL Server con MariaDB: [TABLA ...] [--full | --sample]
+            args = sys.argv[2:]
+            mode = 'full' if '--full' in args else 'sample' if '--sample' in args else None
+            tables = [arg for arg in args if not arg.startswith('--')]
+            success = syncronizer.verify_all_tables(tables, mode)
+            sys.exit(0 if success else 1)
+            
+        elif command == 'load-from-snapshot':
+            # Recargar MariaDB desde los snapshots en disco: [TABLA ...] [--run ID]
+            args = sys.argv[2:]
+            run_id = None
+            if '--run' in args:
+                position = args.index('--run')
+                run_id = args[position + 1] if position + 1 < len(args) else None
+                args = args[:position] + args[position + 2:]
+            success = syncronizer.load_all_from_snapshots(args, run_id)
+            sys.exit(0 if success else 1)
+            
         else:
             print("Comandos disponibles:")
             print("  test     - Probar conexiones")
-            print("  sync     - Ejecutar sincronización manual")
+            print("  sync     - Ejecutar sincronización manual (--resume para continuar una recarga interrumpida)")
             print("  schedule - Iniciar programador automático")
+            print("  load-from-snapshot [TABLA ...] [--run ID] - Recargar MariaDB desde los snapshots en disco")
+            print("  verify [TABLA ...] [--full|--sample] - Comparar filas y checksums por rango de clave con SQL Server")
             sys.exit(1)
     else:
         # Por defecto, mostrar ayuda
@@ -762,11 +3611,19 @@ def main():
         print("\nComandos disponibles:")
         print("  test     - Probar conexiones a ambas bases de datos")
         print("  sync     - Ejecutar sincronización manual inmediata")
+        print("             --resume continúa las recargas interrumpidas desde la última clave confirmada")
         print("  schedule - Iniciar el programador automático")
+        print("  load-from-snapshot [TABLA ...] [--run ID]")
+        print("           - Recargar MariaDB desde el último snapshot (o el indicado) sin leer SQL Server")
+        print("  verify [TABLA ...] [--full|--sample]")
+        print("           - Comparar MariaDB con SQL Server (filas y checksums por rango); código 1 si hay diferencias")
         print("\nEjemplos:")
         print("  python db_sync.py test")
         print("  python db_sync.py sync")
+        print("  python db_sync.py sync --resume")
         print("  python db_sync.py schedule")
+        print("  python db_sync.py load-from-snapshot SUMSOC_HST")
+        print("  python db_sync.py verify --full SOCIOS")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file